@@ -1,7 +1,7 @@
 import argparse
 import logging
 
-from .slicer import generate_gcode
+from .slicer import generate_plate_gcode
 
 logger = logging.getLogger(__name__)
 logging.basicConfig()
@@ -11,7 +11,7 @@ def cli():
     p = argparse.ArgumentParser(
         description="A command line object slicer for .obj files."
     )
-    p.add_argument("filename", type=str, help="The name of the .obj file")
+    p.add_argument("filename", type=str, nargs="+", help="The name of the .obj file. Pass several files to print them together on one plate.")
     p.add_argument(
         "--output",
         "-o",
@@ -84,8 +84,8 @@ def cli():
     p.add_argument(
         "--misc_infill",
         type=str,
-        default="cross",
-        choices=["cross", "solid", "none"],
+        default="grid",
+        choices=["grid", "triangles", "honeycomb", "gyroid", "cross", "solid", "none"],
         help="The type of infill to apply for layers before and after `num_filled` solid infill layers.",
     )
     p.add_argument(
@@ -110,8 +110,8 @@ def cli():
     p.add_argument(
         "--misc_infill_kwargs",
         type=str,
-        default="{'gap_between_crosses': 5}",
-        help="The related keyword arguments for the misc infill.",
+        default="{'density': 0.2}",
+        help="The related keyword arguments for the misc infill. `density` is the fraction of the area that is filled.",
     )
     p.add_argument(
         "--base_offset",
@@ -119,13 +119,122 @@ def cli():
         default="args.layer_height/2",
         help="Offset the base of the design so that the nozzle does not hit the bed.",
     )
-
-    # TODO: wall_speed, infill_speed
+    p.add_argument(
+        "--placements",
+        type=str,
+        default="None",
+        help="A list of (x, y) positions of the center of each object on the plate, e.g. \"[(0, 0), (30, 0)]\". "
+        "Objects are arranged in a row if not given.",
+    )
+    p.add_argument(
+        "--spacing",
+        type=float,
+        default=5,
+        help="The gap between objects that are arranged in a row on the plate.",
+    )
+    p.add_argument(
+        "--processes",
+        type=int,
+        default=None,
+        help="The number of processes used to slice the objects on a plate. (Default: number of CPUs)",
+    )
+    for feature in ["outer_wall", "solid_infill", "sparse_infill", "support", "first_layer"]:
+        p.add_argument(
+            f"--{feature}_speed",
+            type=float,
+            default=None,
+            help=f"The speed at which the {feature.replace('_', ' ')} is printed in mm/min. (Default: feedrate_writing)",
+        )
+    p.add_argument(
+        "--min_layer_time",
+        type=float,
+        default=0,
+        help="The minimum time in seconds to spend on each layer. Faster layers are slowed down to let them cool.",
+    )
+    p.add_argument(
+        "--min_print_speed",
+        type=float,
+        default=600,
+        help="The slowest speed in mm/min that layers are slowed down to for `min_layer_time`.",
+    )
+    p.add_argument(
+        "--seam",
+        type=str,
+        default="hidden",
+        choices=["aligned", "nearest", "hidden"],
+        help="Where each wall starts and ends. Aligned seams line up at the back of the object, "
+        "nearest seams start close to the nozzle and hidden seams are tucked into corners.",
+    )
+    p.add_argument(
+        "--retract_length",
+        type=float,
+        default=1,
+        help="The length of filament in mm to retract before travel moves. Use 0 to not retract.",
+    )
+    p.add_argument(
+        "--retract_speed",
+        type=float,
+        default=2400,
+        help="The speed at which the filament is retracted and primed in mm/min.",
+    )
+    p.add_argument(
+        "--retract_min_travel",
+        type=float,
+        default=2,
+        help="Travel moves shorter than this many mm do not retract.",
+    )
+    p.add_argument(
+        "--z_hop",
+        type=float,
+        default=0,
+        help="The height in mm to lift the nozzle by while travelling.",
+    )
+    p.add_argument(
+        "--coast_distance",
+        type=float,
+        default=0,
+        help="The distance in mm at the end of a path before a retraction that is printed without extruding.",
+    )
+    p.add_argument(
+        "--wipe_distance",
+        type=float,
+        default=0,
+        help="The distance in mm to wipe the nozzle along the start of a wall before a retraction.",
+    )
+    p.add_argument(
+        "--support",
+        action="store_true",
+        help="Generate supports under overhangs.",
+    )
+    p.add_argument(
+        "--support_angle",
+        type=float,
+        default=45,
+        help="Faces that face downwards more than this many degrees away from vertical are supported.",
+    )
+    p.add_argument(
+        "--support_density",
+        type=float,
+        default=0.15,
+        help="The fraction of the area under an overhang that is filled with support.",
+    )
+    p.add_argument(
+        "--support_gap",
+        type=float,
+        default=0.2,
+        help="The vertical gap in mm between the supports and the surfaces they support or stand on.",
+    )
 
     args = p.parse_args()
 
-    generate_gcode(
-        args.filename,
+    placements = eval(args.placements) or [None]*len(args.filename)
+    assert len(placements) == len(args.filename), "There must be a placement for every object"
+
+    speeds = {feature: getattr(args, f"{feature}_speed") for feature in ["outer_wall", "solid_infill", "sparse_infill", "support", "first_layer"]}
+    speeds = {feature: speed for feature, speed in speeds.items() if speed is not None}
+
+    generate_plate_gcode(
+        list(zip(args.filename, placements)),
         outfile=args.output,
         layer_height=args.layer_height,
         scale=args.scale,
@@ -142,6 +251,22 @@ def cli():
         bed_temperature=args.bed_temperature,
         units=args.units,
         base_offset=eval(args.base_offset),
+        speeds=speeds,
+        min_layer_time=args.min_layer_time,
+        min_print_speed=args.min_print_speed,
+        seam=args.seam,
+        retract_length=args.retract_length,
+        retract_speed=args.retract_speed,
+        retract_min_travel=args.retract_min_travel,
+        z_hop=args.z_hop,
+        coast_distance=args.coast_distance,
+        wipe_distance=args.wipe_distance,
+        support=args.support,
+        support_angle=args.support_angle,
+        support_density=args.support_density,
+        support_gap=args.support_gap,
+        spacing=args.spacing,
+        processes=args.processes,
     )
 
 
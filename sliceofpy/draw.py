@@ -1,8 +1,68 @@
 import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
 from mecode import G as meG
 
 # Monkey-patch mecode so that I can draw the slicers in 2-D and 3-D?
 
+def join_paths(paths):
+    "Concatenate a list of (N,3) paths into one array with a row of NaNs between each path."
+    paths = [p for p in paths if len(p) > 0]
+    if len(paths) == 0:
+        return np.empty((0, 3))
+    sep = np.full((1, paths[0].shape[1]), np.nan)
+    return np.concatenate([a for p in paths for a in (p, sep)][:-1])
+
+def decimate(path, tolerance):
+    """Reduce the number of points in a NaN separated `path` for display.
+
+    Consecutive points that fall into the same `tolerance` sized cell
+    are dropped. NaN separators and the ends of each sub-path are kept
+    so that no lines are joined together or shortened.
+    """
+    if tolerance <= 0 or len(path) < 3:
+        return path
+    nans = np.isnan(path[:, 0])
+    cells = np.floor(path/tolerance)
+    keep = np.ones(len(path), dtype=bool)
+    keep[1:] = np.any(cells[1:] != cells[:-1], axis=1)
+    keep |= nans
+    keep[:-1] |= nans[1:]
+    keep[-1] = True
+    return path[keep]
+
+def lod_tolerance(ax, pixels=1):
+    "The distance in data units covered by `pixels` pixels in the current view of `ax`."
+    bbox = ax.get_window_extent()
+    x0, x1 = ax.get_xlim()
+    y0, y1 = ax.get_ylim()
+    return pixels*max(abs(x1-x0)/max(bbox.width, 1), abs(y1-y0)/max(bbox.height, 1))
+
+def render_layer(path, filename, limits, size=4, dpi=100, pixels=1):
+    """Render a single NaN separated layer `path` to `filename` without a display.
+
+    The format is taken from the extension of `filename` (e.g. png or svg).
+    `limits` is a tuple of (min, max) used for both axes so that all layers
+    share the same framing.
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=(size, size), dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_axes([0, 0, 1, 1])
+    ax.set_xlim(*limits)
+    ax.set_ylim(*limits)
+    ax.set_aspect("equal")
+    ax.axis("off")
+    path = decimate(path, pixels*(limits[1]-limits[0])/(size*dpi))
+    ax.plot(path[:, 0], path[:, 1], "tab:blue", linewidth=0.5)
+    fig.savefig(filename)
+    return filename
+
+def _render_layer(args):
+    return render_layer(*args)
+
 # Save non-rapid movements for display in 2d and 3d
 # create method for showing the full movements (meG.view())
 class G():
@@ -16,10 +76,13 @@ class G():
         self.layer_height = kwargs['layer_height']
         self.stored_fast = None
         self.X, self.Y, self.Z = (0,0,0)
+        self.layer_z = 0 # The height of the last extrusion
+        self.retracted = False # Whether the filament is retracted for a travel move
         self.continuous_extrusions = []
         self.tmp_cnt = [] # Store all of the contour pts in a continuous contour
         self.tmp_layer = [] # Stores all the contours of a particular layer
         self.layer_slices = [] # Stores all the contours of all layers (ascending)
+        self._layer_paths = None # Cache of the NaN joined paths of each layer
 
         self.vertices = vertices
         self.x_min,self.y_min,self.z_min = vertices.min(axis=0)
@@ -33,8 +96,10 @@ class G():
         self.g.__exit__(*args)
 
     def move(self, x=None, y=None, z=None, rapid=False, **kwargs):
-        if self.Z != z:
+        # Only extrusions start a new layer, so travel can lift the nozzle
+        if not rapid and self.layer_z != z:
             self.check_tmps()
+            self.layer_z = z
 
         if rapid == False:
             if self.stored_fast is not None and len(self.tmp_cnt) == 0:
@@ -56,6 +121,24 @@ class G():
     def abs_move(self, *args, **kwargs):
         self.move(*args, **kwargs)
 
+    def retract(self, E, F, x=None, y=None, z=None):
+        """Move the extruder to the absolute position `E`, to retract or prime the filament.
+
+        The nozzle can move to (x, y, z) at the same time, to wipe it,
+        without the move being drawn as an extrusion.
+        """
+        if x is not None or y is not None or z is not None:
+            if len(self.tmp_cnt)>0:
+                self.tmp_layer.append(np.array(self.tmp_cnt))
+                self.tmp_cnt = []
+            self.stored_fast = [x, y, z]
+
+        self.g.move(x, y, z, E=E, F=F)
+
+        if x is not None: self.X = x
+        if y is not None: self.Y = y
+        if z is not None: self.Z = z
+
     def __getattr__(self, name):
         return getattr(self.g, name)
 
@@ -66,10 +149,24 @@ class G():
 
         if len(self.tmp_layer)>0:
             self.continuous_extrusions.append(self.tmp_layer)
+            self._layer_paths = None
 
         self.tmp_layer = []
         self.tmp_cnt = []
 
+    def layer_paths(self):
+        "The extrusions of each layer as a single NaN separated (N,3) array."
+        self.check_tmps()
+        if self._layer_paths is None or len(self._layer_paths) != len(self.continuous_extrusions):
+            self._layer_paths = [join_paths(layer).astype(float) for layer in self.continuous_extrusions]
+        return self._layer_paths
+
+    def plot_limits(self):
+        "The square (min, max) limits that frame the model in the XY plane."
+        min_lim, max_lim = min(self.x_min,self.y_min), max(self.x_max, self.y_max)
+        pad = (max_lim-min_lim)/20
+        return min_lim-pad, max_lim+pad
+
     def plot3d(self, show_all=False):
         """
         Plot the Gecode that will be printed.
@@ -89,12 +186,7 @@ class G():
             import matplotlib.pyplot as plt
 
             fig = plt.figure()
-            ax = fig.gca(projection='3d')
-
-            for layer in self.continuous_extrusions:
-                for contour in layer:
-                    X, Y, Z = contour[:, 0], contour[:, 1], contour[:, 2]
-                    ax.plot(X, Y, Z, 'tab:blue')
+            ax = fig.add_subplot(projection='3d')
 
             # Hack to keep 3D plot's aspect ratio square. See SO answer:
             # http://stackoverflow.com/questions/13685386
@@ -102,6 +194,13 @@ class G():
                                     self.y_max-self.y_min,
                                     self.z_max-self.z_min]).max() / 2.0
 
+            # Draw every layer with a single artist, decimated to the screen resolution
+            path = join_paths(self.layer_paths())
+            bbox = ax.get_window_extent()
+            path = decimate(path, 2*max_range/max(bbox.width, bbox.height, 1))
+            if len(path) > 0:
+                ax.plot(path[:, 0], path[:, 1], path[:, 2], 'tab:blue')
+
             mean_x, mean_y, mean_z = self.vertices.mean(0)
             ax.set_xlim(mean_x - max_range, mean_x + max_range)
             ax.set_ylim(mean_y - max_range, mean_y + max_range)
@@ -112,28 +211,80 @@ class G():
     def plot2d(self):
         """
         Plot a sequence of 2D slices with a slider alongside to increment the layer.
+
+        Each layer is drawn once as a single line and cached, so moving
+        the slider only toggles visibility. Layers are re-decimated when
+        the view is zoomed so that detail is only drawn where it is visible.
         """
         import matplotlib as mp
         import matplotlib.pyplot as plt
 
-        self.check_tmps()
+        layers = self.layer_paths()
 
         f,ax = plt.subplots(1,2, gridspec_kw={'width_ratios': [6, 1]})
-        min_lim, max_lim = min(self.x_min,self.y_min), max(self.x_max, self.y_max)
-        pad = (max_lim-min_lim)/20
+        ax[0].set_xlim(*self.plot_limits())
+        ax[0].set_ylim(*self.plot_limits())
+
+        artists = {} # layer index -> (line, tolerance it was decimated with)
+        current = [0]
+
+        def update_artist(i):
+            tol = lod_tolerance(ax[0])
+            if i not in artists:
+                artists[i] = (ax[0].plot([], [], "tab:blue")[0], None)
+            line, line_tol = artists[i]
+            if line_tol != tol:
+                path = decimate(layers[i], tol)
+                line.set_data(path[:, 0], path[:, 1])
+                artists[i] = (line, tol)
+            return line
 
         def plot_layer(layer_height):
             i = int(round(layer_height/self.layer_height))
-            assert i < len(self.continuous_extrusions)
-            ax[0].cla()
-            for contour in self.continuous_extrusions[i]:
-                X, Y = contour[:, 0], contour[:, 1]
-                ax[0].plot(X, Y, "tab:blue")
-                ax[0].set_xlim(min_lim-pad, max_lim+pad)
-                ax[0].set_ylim(min_lim-pad, max_lim+pad)
+            assert i < len(layers)
+            artists[current[0]][0].set_visible(False)
+            update_artist(i).set_visible(True)
+            current[0] = i
+            f.canvas.draw_idle()
 
-        plot_layer(0)
-        sl = mp.widgets.Slider(ax[1], "Layer Height", 0, (len(self.continuous_extrusions)-1)*self.layer_height, orientation="vertical", valstep=self.layer_height, valinit=0)
+        update_artist(0)
+        ax[0].callbacks.connect("xlim_changed", lambda _: update_artist(current[0]))
+        sl = mp.widgets.Slider(ax[1], "Layer Height", 0, (len(layers)-1)*self.layer_height, orientation="vertical", valstep=self.layer_height, valinit=0)
 
         sl.on_changed(plot_layer)
         plt.show(block=True)
+
+    def save_thumbnails(self, directory, fmt="png", processes=None, size=4, dpi=100):
+        """
+        Render a thumbnail of each layer without a display.
+
+        Arguments:
+
+        directory (str)
+            The directory in which to save the thumbnails.
+        fmt (str)
+            The image format. Any format supported by matplotlib,
+            e.g. "png" or "svg".
+            Default: "png"
+        processes (int)
+            The number of processes to render with. Use 1 to render
+            in the current process.
+            Default: os.cpu_count()
+        size (float)
+            The width and height of the thumbnail in inches.
+            Default: 4
+        dpi (int)
+            The resolution of the thumbnail in dots per inch.
+            Default: 100
+
+        Returns the list of filenames in layer order.
+        """
+        os.makedirs(directory, exist_ok=True)
+        limits = self.plot_limits()
+        jobs = [(path, os.path.join(directory, f"layer_{i:05d}.{fmt}"), limits, size, dpi)
+                for i, path in enumerate(self.layer_paths())]
+
+        if processes == 1:
+            return [_render_layer(job) for job in jobs]
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return list(executor.map(_render_layer, jobs))
@@ -1,94 +1,372 @@
 import numpy as np
+import warnings
 from enum import IntEnum
+from functools import lru_cache
 
-from .math_utils import get_intersection, distance_between
+from .math_utils import intersect_segments, cross_2d
 
 class Axis(IntEnum):
     X = 0
     Y = 1
     Z = 2
 
-def find_faces_at_index(layer_qs, coord_val, index):
-    """Find all the faces that intersect `coord_val` along `index`
+def contour_segments(layer_qs):
+    "Stack the contour segments of all the faces in a layer into two (N,3) arrays of end points."
+    faces = [face for face_q in layer_qs for face in face_q]
+    if len(faces) == 0:
+        return np.empty((0, 3)), np.empty((0, 3))
+    return np.stack([face.contour_points[0] for face in faces]), np.stack([face.contour_points[1] for face in faces])
+
+def find_faces_at_index(segments, coord_val, index):
+    """Find all the contour segments that intersect `coord_val` along `index`
+
+    Returns a boolean mask over the segments.
 
     Example
     Slice a list of faces along the x-axis so that you can tell
     where to fill the shape in, by drawing lines across the polygon.
     """
-    return [face for face_q in layer_qs for face in face_q
-        if ((face.contour_points[0][index] > coord_val and face.contour_points[1][index] <= coord_val) or
-            (face.contour_points[1][index] > coord_val and face.contour_points[0][index] <= coord_val))]
+    c1, c2 = segments
+    return (c1[:, index] > coord_val) != (c2[:, index] > coord_val)
 
-def get_intersections(faces, coord_val, index):
-    "Get the intersections between a list of face queues at a particular `coord_val` along `index`"
+def get_intersections(segments, coord_val, index):
+    "Get the intersections between a set of contour segments at a particular `coord_val` along `index`"
     # Does z even make sense?
-    if index == Axis.X:
-        coord = {"x": coord_val}
-    elif index == Axis.Y:
-        coord = {"y": coord_val}
-    elif index == Axis.Z:
-        coord = {"z": coord_val}
-    return np.stack([get_intersection(face.contour_points[0], face.contour_points[1], **coord) for face in faces])
-
-def fill_across_index(g, layer_qs, index, current_val, order_axes_by, extrusion_rate, total_extruded, total_distance):
-    "Fills a polygon across `index` in G-code"
-    faces_at_val = find_faces_at_index(layer_qs, current_val, index)
-    if len(faces_at_val) == 0:
-        return total_distance, total_extruded
-
-    intersections = get_intersections(faces_at_val, current_val, index)
+    c1, c2 = segments
+    return intersect_segments(c1, c2, index, coord_val)
+
+def fill_across_index(segments, index, current_val, order_axes_by):
+    """Fills a polygon, given by its contour `segments`, across `index`
+
+    Returns the (N,3) start and end points of the fill lines.
+    """
+    crossing = find_faces_at_index(segments, current_val, index)
+    if not crossing.any():
+        return np.empty((0, 3)), np.empty((0, 3))
+
+    intersections = get_intersections((segments[0][crossing], segments[1][crossing]), current_val, index)
     intersections = np.unique(intersections, axis=0)
     if len(intersections) == 1:
-        return total_distance, total_extruded
+        return np.empty((0, 3)), np.empty((0, 3))
 
     # Sort by the correct index/axis
     idxs = np.argsort(intersections[:, order_axes_by])
     sorted_intersections = intersections[idxs]
 
     assert len(sorted_intersections)%2 == 0, f"len(intersections)={len(intersections)} should be even but isn't. Something's funky..."
-    for i in range(0, len(sorted_intersections), 2):
-        # Move to starting point
-        g.abs_move(*sorted_intersections[i], rapid=True)
-
-        # Extrude across distance
-        total_distance += distance_between(sorted_intersections[i], sorted_intersections[i+1])
-        total_extruded = extrusion_rate*total_distance
-        g.abs_move(*sorted_intersections[i+1], E=total_extruded)
+    return sorted_intersections[0::2], sorted_intersections[1::2]
 
-    return total_distance, total_extruded
 
-
-def gap_fill(g, layer_qs, index, start_val, end_val, extrusion_rate, total_extruded, total_distance, n_fill_lines=None, gap=None):
+def gap_fill(layer_qs, index, start_val, end_val, n_fill_lines=None, gap=None):
     """Fill a polygon with a gap in between the lines that fill it.
 
-    The gap has a size of either `gap` or is evenly divided by `n_fill_lines`
+    The gap has a size of either `gap` or is evenly divided by `n_fill_lines`.
+    Returns a list of (2,3) paths.
     """
     assert (n_fill_lines is not None) ^ (gap is not None)
     gap = gap or (end_val-start_val)/n_fill_lines
     order_axes_by = (index+1)%2
+    segments = contour_segments(layer_qs)
 
+    paths = []
     for current_val in np.arange(start_val+gap, end_val, gap):
-        total_distance, total_extruded = fill_across_index(g, layer_qs, index, current_val, order_axes_by, extrusion_rate, total_extruded, total_distance)
+        starts, ends = fill_across_index(segments, index, current_val, order_axes_by)
+        paths.extend(np.stack([starts, ends], axis=1))
 
-    return total_distance, total_extruded
+    return paths
 
-def solid(g, layer_qs, index, start_val, end_val, extrusion_rate, total_extruded, total_distance, extrusion_width):
+def solid(layer_qs, index, start_val, end_val, extrusion_width):
     "Apply a solid fill using a gap fill of size `extrusion_width`"
-    g.write("\n; Printing solid infill")
-    return gap_fill(g, layer_qs, index, start_val, end_val, extrusion_rate, total_extruded, total_distance, gap=1)
+    return gap_fill(layer_qs, index, start_val, end_val, gap=1)
+
+def line_family(bounds, spacing, angle):
+    """Parallel lines at `angle` degrees, `spacing` apart, covering `bounds`.
+
+    The lines are anchored at the center of the bounds so that families
+    at different angles cross at common points.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    center = np.array([(x_min+x_max)/2, (y_min+y_max)/2])
+    radius = np.hypot(x_max-x_min, y_max-y_min)/2 + spacing
+    offsets = np.arange(-np.ceil(radius/spacing), np.ceil(radius/spacing)+1)*spacing
+
+    angle = np.radians(angle)
+    direction = np.array([np.cos(angle), np.sin(angle)])
+    normal = np.array([-direction[1], direction[0]])
+    mids = center + offsets[:, None]*normal
+    return mids - radius*direction, mids + radius*direction
+
+def lines_pattern(bounds, spacing, angles):
+    "A pattern of straight line families, one path per line."
+    families = [line_family(bounds, spacing, angle) for angle in angles]
+    starts = np.concatenate([f[0] for f in families])
+    ends = np.concatenate([f[1] for f in families])
+    return starts, ends, np.arange(len(starts))
+
+def honeycomb_pattern(bounds, side):
+    """Zig-zag paths that trace a tiling of flat-topped hexagons with edge length `side`.
+
+    Every pair of neighbouring paths mirror each other and touch along
+    their horizontal edges, which closes each row of hexagons.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    h = np.sqrt(3)*side/2
+    period = 3*side
+    x0 = x_min - period
+    n_periods = int(np.ceil((x_max - x0)/period)) + 1
+    n_paths = int(np.ceil((y_max - y_min)/h)) + 3
+
+    # One period of the zig-zag: flat at y=0, up to y=h, flat, then back down
+    unit_x = np.array([0, side, 1.5*side, 2.5*side])
+    unit_y = np.array([0, 0, h, h])
+    xs = (x0 + np.arange(n_periods)[:, None]*period + unit_x).reshape(-1)
+    ys = np.tile(unit_y, n_periods)
+
+    # Alternate paths are mirrored so that they enclose the hexagons
+    k = np.arange(n_paths)
+    offsets = y_min - 2*h + 2*h*(k//2) + np.where(k%2 == 0, 0, 2*h)
+    signs = np.where(k%2 == 0, 1, -1)
+    path_ys = offsets[:, None] + signs[:, None]*ys
+    path_xs = np.broadcast_to(xs, path_ys.shape)
+
+    points = np.stack([path_xs, path_ys], axis=-1)
+    starts = points[:, :-1].reshape(-1, 2)
+    ends = points[:, 1:].reshape(-1, 2)
+    return starts, ends, np.repeat(k, len(xs)-1)
+
+def gyroid_pattern(bounds, cell_size, z, resolution=16):
+    """The cross section of a gyroid surface with a period of `cell_size` at height `z`.
+
+    The gyroid is sampled on a grid with `resolution` points per period
+    and traced with marching squares. Crossings are stored per grid edge
+    so that the segments of neighbouring cells can be chained into paths.
+    """
+    x_min, x_max, y_min, y_max = bounds
+    step = cell_size/resolution
+    xs = np.arange(x_min - step, x_max + 2*step, step)
+    ys = np.arange(y_min - step, y_max + 2*step, step)
+    u, v = np.meshgrid(2*np.pi*xs/cell_size, 2*np.pi*ys/cell_size, indexing="ij")
+    w = 2*np.pi*z/cell_size
+    f = np.sin(u)*np.cos(v) + np.sin(v)*np.cos(w) + np.sin(w)*np.cos(u)
+    nx, ny = f.shape
+    above = f > 0
+
+    # Crossing points on the edges along x (h) and along y (v)
+    def crossings(f0, f1, x0, y0, dx, dy):
+        t = f0/np.where(f0 == f1, 1, f0 - f1)
+        return np.stack([x0 + t*dx, y0 + t*dy], axis=-1)
+
+    X, Y = np.meshgrid(xs, ys, indexing="ij")
+    h_pts = crossings(f[:-1], f[1:], X[:-1], Y[:-1], step, 0).reshape(-1, 2)
+    v_pts = crossings(f[:, :-1], f[:, 1:], X[:, :-1], Y[:, :-1], 0, step).reshape(-1, 2)
+    h_cross = (above[:-1] != above[1:]).reshape(-1)
+    v_cross = (above[:, :-1] != above[:, 1:]).reshape(-1)
+    points = np.concatenate([h_pts, v_pts])
+    crossed = np.concatenate([h_cross, v_cross])
+
+    # Edge ids around each cell: bottom, right, top, left
+    i, j = np.meshgrid(np.arange(nx-1), np.arange(ny-1), indexing="ij")
+    i, j = i.reshape(-1), j.reshape(-1)
+    n_h = (nx-1)*ny
+    cell_edges = np.stack([i*ny + j, n_h + (i+1)*(ny-1) + j, i*ny + j + 1, n_h + i*(ny-1) + j], axis=1)
+    cell_crossed = crossed[cell_edges]
+    n_crossed = cell_crossed.sum(axis=1)
+
+    # Cells with two crossings join them directly
+    two = n_crossed == 2
+    first = np.argmax(cell_crossed[two], axis=1)
+    second = 3 - np.argmax(cell_crossed[two][:, ::-1], axis=1)
+    links = [cell_edges[two][np.arange(two.sum()), first], cell_edges[two][np.arange(two.sum()), second]]
+
+    # Saddle cells are resolved using the value at the cell center
+    four = cell_edges[n_crossed == 4]
+    center = (f[:-1, :-1] + f[1:, :-1] + f[:-1, 1:] + f[1:, 1:]).reshape(-1)[n_crossed == 4]
+    corner = f[:-1, :-1].reshape(-1)[n_crossed == 4]
+    join_bottom_left = (center > 0) != (corner > 0)
+    links[0] = np.concatenate([links[0], four[:, 0], four[:, 2]])
+    links[1] = np.concatenate([links[1], np.where(join_bottom_left, four[:, 3], four[:, 1]),
+                                         np.where(join_bottom_left, four[:, 1], four[:, 3])])
 
-def criss_cross(g, layer_qs, x_min, x_max, y_min, y_max, extrusion_rate, total_extruded, total_distance, extrusion_width, number_of_crosses=None, gap_between_crosses=None):
-    """Must specify either number_of_crosses or size_of_crosses but not both.
+    # Each crossed edge has at most two neighbours. Chain them into paths.
+    src = np.concatenate(links)
+    dst = np.concatenate(links[::-1])
+    order = np.argsort(src, kind="stable")
+    src, dst = src[order], dst[order]
+    first_of_src = np.concatenate([[True], src[1:] != src[:-1]])
+    rank = np.where(first_of_src, 0, 1)
+    neighbours = np.full((len(points), 2), -1)
+    neighbours[src, rank] = dst
+
+    degree = (neighbours >= 0).sum(axis=1)
+    seeds = np.concatenate([np.nonzero(degree == 1)[0], np.nonzero(degree == 2)[0]])
+    visited = np.zeros(len(points), dtype=bool)
+    paths = []
+    for seed in seeds:
+        if visited[seed]:
+            continue
+        path = [seed]
+        visited[seed] = True
+        prev, node = -1, seed
+        while True:
+            a, b = neighbours[node]
+            nxt = b if a == prev else a
+            if nxt == -1:
+                break
+            if visited[nxt]:
+                if nxt == seed:
+                    path.append(seed)
+                break
+            path.append(nxt)
+            visited[nxt] = True
+            prev, node = node, nxt
+        paths.append(np.array(path))
+
+    starts = np.concatenate([points[p[:-1]] for p in paths])
+    ends = np.concatenate([points[p[1:]] for p in paths])
+    path_ids = np.repeat(np.arange(len(paths)), [len(p)-1 for p in paths])
+    return starts, ends, path_ids
+
+# Length of line per unit area of each pattern for a spacing (or cell size) of 1.
+# The gyroid value is its surface area per unit volume (~3.09/cell_size)
+# scaled by pi/4 to get the length of its cross section per unit area.
+INFILL_PATTERNS = {
+    "grid": (lambda bounds, size, z: lines_pattern(bounds, size, [0, 90]), 2),
+    "triangles": (lambda bounds, size, z: lines_pattern(bounds, size, [0, 60, 120]), 3),
+    "honeycomb": (lambda bounds, size, z: honeycomb_pattern(bounds, size), 8/(3*np.sqrt(3))),
+    "gyroid": (lambda bounds, size, z: gyroid_pattern(bounds, size, z), 3.0919*np.pi/4),
+}
+
+@lru_cache(maxsize=128)
+def _cached_pattern(pattern, bounds, size, z):
+    return INFILL_PATTERNS[pattern][0](bounds, size, z)
+
+def infill_pattern(pattern, bounds, density, extrusion_width, z=0):
+    """Generate the global paths of a sparse infill `pattern` over the XY `bounds`.
+
+    `density` is the fraction of the area that is filled by lines of
+    width `extrusion_width`. Patterns are cached, so every layer that
+    shares a pattern reuses the same paths. Only the gyroid changes
+    with `z`, and it repeats every cell.
+
+    Returns the (N,2) start and end points of the pattern segments and
+    the id of the path each segment belongs to. Consecutive segments of
+    a path are connected.
+    """
+    if pattern not in INFILL_PATTERNS:
+        raise ValueError(f"Infill pattern not recognized: {pattern}. Use one of {list(INFILL_PATTERNS)}")
+    assert 0 < density <= 1, "density must be in (0, 1]"
+    size = INFILL_PATTERNS[pattern][1]*extrusion_width/density
+    z = round(z % size, 6) if pattern == "gyroid" else 0
+    return _cached_pattern(pattern, tuple(float(b) for b in bounds), size, z)
+
+def points_in_region(points, segments, max_elements=1<<22):
+    """Test which (N,2) `points` are inside the region enclosed by the closed contour `segments`.
+
+    Uses the even-odd rule, casting a ray along +x from every point
+    against every contour segment at once, in chunks of at most
+    `max_elements` pairs.
+    """
+    q0, q1 = segments[0][:, :2], segments[1][:, :2]
+    e = q1 - q0
+    inside = np.zeros(len(points), dtype=bool)
+    chunk = max(1, max_elements//max(len(q0), 1))
+    for c in range(0, len(points), chunk):
+        p = points[c:c+chunk]
+        ys = p[:, 1:2]
+        straddle = (q0[None, :, 1] > ys) != (q1[None, :, 1] > ys)
+        dy = np.where(straddle, e[None, :, 1], 1)
+        x_cross = q0[None, :, 0] + (ys - q0[None, :, 1])*e[None, :, 0]/dy
+        inside[c:c+chunk] = (np.sum(straddle & (x_cross > p[:, 0:1]), axis=1) % 2) == 1
+    return inside
+
+def clip_segments(starts, ends, path_ids, segments, max_elements=1<<22):
+    """Clip pattern segments to the region enclosed by the closed contour `segments`.
+
+    Every pattern segment is intersected with every contour segment at
+    once and split at the intersections. The pieces whose midpoints lie
+    inside the region are kept. Work is done in chunks of at most
+    `max_elements` pairs to limit memory use.
+
+    Returns a list of (k,2) paths inside the region, joining pieces of
+    the same pattern path that remain connected.
+    """
+    q0, q1 = segments[0][:, :2], segments[1][:, :2]
+    if len(q0) == 0 or len(starts) == 0:
+        return []
+
+    # Only consider segments that overlap the region's bounding box
+    lo, hi = np.minimum(q0, q1).min(axis=0), np.maximum(q0, q1).max(axis=0)
+    near = np.all((np.maximum(starts, ends) >= lo) & (np.minimum(starts, ends) <= hi), axis=1)
+    idx = np.nonzero(near)[0]
+    if len(idx) == 0:
+        return []
+
+    e = q1 - q0
+    piece_idx, piece_t0, piece_t1 = [], [], []
+    chunk = max(1, max_elements//len(q0))
+    for c in range(0, len(idx), chunk):
+        i = idx[c:c+chunk]
+        p0, d = starts[i], ends[i] - starts[i]
+        r = q0[None] - p0[:, None]
+
+        # Intersections with the contour, strictly inside each pattern segment
+        denom = cross_2d(d[:, None], e[None])
+        parallel = denom == 0
+        denom = np.where(parallel, 1, denom)
+        t = cross_2d(r, e[None])/denom
+        s = cross_2d(r, d[:, None])/denom
+        hits = ~parallel & (t > 0) & (t < 1) & (s >= 0) & (s <= 1)
+
+        # Split each segment at its hits
+        seg, _ = np.nonzero(hits)
+        seg = np.concatenate([np.arange(len(i)), seg, np.arange(len(i))])
+        ts = np.concatenate([np.zeros(len(i)), t[hits], np.ones(len(i))])
+        order = np.lexsort((ts, seg))
+        seg, ts = seg[order], ts[order]
+        pieces = (seg[1:] == seg[:-1]) & (ts[1:] > ts[:-1])
+        seg, t0, t1 = seg[:-1][pieces], ts[:-1][pieces], ts[1:][pieces]
+
+        # Keep the pieces inside the region
+        mids = p0[seg] + ((t0 + t1)/2)[:, None]*d[seg]
+        inside = points_in_region(mids, segments, max_elements)
+        piece_idx.append(i[seg[inside]])
+        piece_t0.append(t0[inside])
+        piece_t1.append(t1[inside])
+
+    piece_idx = np.concatenate(piece_idx)
+    if len(piece_idx) == 0:
+        return []
+    t0, t1 = np.concatenate(piece_t0), np.concatenate(piece_t1)
+    d = ends[piece_idx] - starts[piece_idx]
+    a = np.where((t0 == 0)[:, None], starts[piece_idx], starts[piece_idx] + t0[:, None]*d)
+    b = np.where((t1 == 1)[:, None], ends[piece_idx], starts[piece_idx] + t1[:, None]*d)
+
+    # Join pieces that continue the same path
+    joined = (path_ids[piece_idx[1:]] == path_ids[piece_idx[:-1]]) & np.all(a[1:] == b[:-1], axis=1)
+    breaks = np.nonzero(~joined)[0] + 1
+    return [np.concatenate([pa[:1], pb]) for pa, pb in zip(np.split(a, breaks), np.split(b, breaks))]
+
+def sparse(layer_qs, pattern, bounds, extrusion_width, density=0.2, gap_between_crosses=None):
+    """Apply a sparse infill `pattern` with a fill `density` between 0 and 1.
+
+    Returns a list of (k,3) paths.
+
+    `gap_between_crosses` is deprecated in favour of `density`. When it
+    is given it replaces `density` with the density of a grid of lines
+    `gap_between_crosses` apart.
 
     Note
-    Use a global coord min and max so that the criss crosses are
-    on top of each other in consecutive layers.
+    Use the global XY `bounds` of the model so that the pattern is
+    the same, and cached, on every layer.
     """
-    assert (number_of_crosses is not None) ^ (gap_between_crosses is not None)
-    x_gap = gap_between_crosses or (x_max-x_min)/number_of_crosses
-    y_gap = gap_between_crosses or (y_max-y_min)/number_of_crosses
-
-    g.write("\n; Printing x criss-crosses for cross infill")
-    total_distance, total_extruded =  gap_fill(g, layer_qs, Axis.X, x_min, x_max, extrusion_rate, total_extruded, total_distance, gap=x_gap)
-    g.write("\n; Printing y criss-crosses for cross infill")
-    return gap_fill(g, layer_qs, Axis.Y, y_min, y_max, extrusion_rate, total_extruded, total_distance, gap=y_gap)
+    if gap_between_crosses is not None:
+        density = min(INFILL_PATTERNS["grid"][1]*extrusion_width/gap_between_crosses, 1)
+        warnings.warn(f"gap_between_crosses is deprecated, use density instead. "
+                      f"A gap of {gap_between_crosses} is a density of {density:.3g}.", DeprecationWarning)
+    segments = contour_segments(layer_qs)
+    if len(segments[0]) == 0:
+        return []
+
+    z = segments[0][0, 2]
+    paths = clip_segments(*infill_pattern(pattern, bounds, density, extrusion_width, z), segments)
+    return [np.column_stack([path, np.full(len(path), z)]) for path in paths]
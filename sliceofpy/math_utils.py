@@ -1,24 +1,39 @@
 import numpy as np
 
+def intersect_segments(c1, c2, axis, values):
+    """Calculate the intersections of the segments c1->c2 with the planes `axis`=`values`.
+
+    `c1` and `c2` are (N,3) arrays of segment end points. `values` is
+    either a single value or an array of N values, one per segment.
+    Segments that have no extent along `axis` are parallel to the plane
+    and do not have a single intersection point, so they return a row
+    of NaNs instead of dividing by zero.
+    """
+    c1 = np.asarray(c1, dtype=float)
+    c2 = np.asarray(c2, dtype=float)
+    values = np.broadcast_to(np.asarray(values, dtype=float), c1.shape[:1])
+    extent = c2[:, axis] - c1[:, axis]
+    parallel = extent == 0
+    t = np.divide(values - c1[:, axis], extent, out=np.full(len(c1), np.nan), where=~parallel)
+    pts = c1 + t[:, None]*(c2 - c1)
+    pts[~parallel, axis] = values[~parallel]
+    return pts
+
+def segment_lengths(c1, c2):
+    "Calculate the lengths of the segments c1->c2, given as (N,3) arrays of end points."
+    return np.sqrt(np.sum(np.square(np.asarray(c1) - np.asarray(c2)), axis=-1))
+
+def cross_2d(a, b):
+    "The z component of the cross product of arrays of 2D vectors `a` and `b`."
+    return a[..., 0]*b[..., 1] - a[..., 1]*b[..., 0]
+
 def get_intersection(c1, c2, **kwargs):
     "Calculate the intersection of the lines c1 and c2, given x, y or z coord."
-    if 'x' in kwargs:
-        x = kwargs['x']
-        y = (x-c1[0])*(c2[1]-c1[1])/(c2[0]-c1[0]) + c1[1]
-        z = (x-c1[0])*(c2[2]-c1[2])/(c2[0]-c1[0]) + c1[2]
-    elif 'y' in kwargs:
-        y = kwargs['y']
-        x = (y-c1[1])*(c2[0]-c1[0])/(c2[1]-c1[1]) + c1[0]
-        z = (y-c1[1])*(c2[2]-c1[2])/(c2[1]-c1[1]) + c1[2]
-    elif 'z' in kwargs:
-        z = kwargs['z']
-        x = (z-c1[2])*(c2[0]-c1[0])/(c2[2]-c1[2]) + c1[0]
-        y = (z-c1[2])*(c2[1]-c1[1])/(c2[2]-c1[2]) + c1[1]
-    else:
-        raise ValueError(f"Must specify one of x, y or z in kwargs:{kwargs}")
-    return np.array([x, y, z])
+    for axis, name in enumerate("xyz"):
+        if name in kwargs:
+            return intersect_segments(np.atleast_2d(c1), np.atleast_2d(c2), axis, kwargs[name])[0]
+    raise ValueError(f"Must specify one of x, y or z in kwargs:{kwargs}")
 
 def distance_between(c1, c2):
-    assert len(c1) == 3
-    assert len(c2) == 3
-    return np.sqrt(np.sum(np.square(c1-c2)))
+    "Calculate the distance between the points c1 and c2."
+    return segment_lengths(c1, c2)
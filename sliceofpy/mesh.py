@@ -0,0 +1,351 @@
+import numpy as np
+import logging
+from itertools import product
+
+from .math_utils import segment_lengths
+
+logger = logging.getLogger(__name__)
+
+class Adjacency():
+    """
+    Indexed edge to face adjacency of a triangle mesh.
+
+    Edge `k` of a face joins its vertices `k` and `k+1`.
+
+    Attributes:
+
+    edges (np.ndarray)
+        (E,2) array of the unique edges as sorted vertex indices.
+    face_edges (np.ndarray)
+        (F,3) array of the edge index of each edge of each face.
+    edge_faces (np.ndarray)
+        (E,2) array of the first two faces that share each edge.
+        Missing faces are -1.
+    edge_counts (np.ndarray)
+        (E,) array of the number of faces that share each edge.
+    """
+    def __init__(self, faces):
+        self.faces = faces
+        half_edges = faces[:, [0,1,1,2,2,0]].reshape(-1, 2)
+        # Pack each sorted edge into a single key so that it can be found with a 1-D unique
+        n = int(faces.max()) + 1 if len(faces) > 0 else 1
+        keys = half_edges.min(axis=1).astype(np.int64)*n + half_edges.max(axis=1)
+        keys, inverse, self.edge_counts = np.unique(keys, return_inverse=True, return_counts=True)
+        self.edges = np.column_stack([keys // n, keys % n]).astype(faces.dtype)
+        inverse = inverse.reshape(-1)
+        self.face_edges = inverse.reshape(-1, 3)
+
+        # Rank each half-edge among the half-edges of the same edge
+        order = np.argsort(inverse, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(self.edge_counts)[:-1]])
+        rank = np.empty(len(inverse), dtype=int)
+        rank[order] = np.arange(len(inverse)) - starts[inverse[order]]
+
+        # Direction of each half-edge relative to its sorted edge
+        self.forward = (half_edges[:, 0] < half_edges[:, 1]).reshape(-1, 3)
+
+        self.edge_faces = np.full((len(self.edges), 2), -1)
+        first_two = rank < 2
+        self.edge_faces[inverse[first_two], rank[first_two]] = np.arange(len(inverse))[first_two]//3
+
+    def neighbor(self, face, edge):
+        "The face on the other side of `edge` from `face`, or -1 if there isn't one."
+        f1, f2 = self.edge_faces[edge]
+        return f2 if f1 == face else f1
+
+    @property
+    def boundary_edges(self):
+        "Edges with only a single face. These are the edges of holes."
+        return np.nonzero(self.edge_counts == 1)[0]
+
+    @property
+    def non_manifold_edges(self):
+        "Edges shared by more than two faces."
+        return np.nonzero(self.edge_counts > 2)[0]
+
+    @property
+    def inconsistent_edges(self):
+        "Manifold edges where both faces traverse the edge in the same direction."
+        manifold = np.nonzero(self.edge_counts == 2)[0]
+        f1, f2 = self.edge_faces[manifold].T
+        d1 = self.forward[f1, np.argmax(self.face_edges[f1] == manifold[:, None], axis=1)]
+        d2 = self.forward[f2, np.argmax(self.face_edges[f2] == manifold[:, None], axis=1)]
+        return manifold[d1 == d2]
+
+class MeshReport():
+    "A summary of the problems found in a mesh and what was repaired."
+    def __init__(self):
+        self.welded_vertices = 0
+        self.triangulated_faces = 0
+        self.removed_faces = 0
+        self.flipped_faces = 0
+        self.filled_holes = 0
+        self.open_edges = 0
+        self.non_manifold_edges = 0
+
+    @property
+    def watertight(self):
+        return self.open_edges == 0 and self.non_manifold_edges == 0
+
+    def __str__(self):
+        return ", ".join(f"{k.replace('_', ' ')}: {v}" for k,v in vars(self).items())
+
+    def __repr__(self):
+        return f"MeshReport({str(self)})"
+
+def triangulate(faces):
+    "Split polygonal faces into a (F,3) array of triangles by fanning from their first vertex."
+    if isinstance(faces, np.ndarray) and faces.ndim == 2 and faces.shape[1] >= 3:
+        return np.stack([faces[:, [0, i, i+1]] for i in range(1, faces.shape[1]-1)], axis=1).reshape(-1, 3)
+    tris = [np.stack([face[[0, i, i+1]] for i in range(1, len(face)-1)]) for face in faces if len(face) >= 3]
+    if len(tris) == 0:
+        return np.empty((0, 3), dtype=int)
+    return np.concatenate(tris)
+
+def connected_components(n, a, b, odd=None):
+    """
+    Label the connected components of a graph of `n` nodes joined by the
+    edges `a`-`b`. Each component is labelled with its smallest node.
+
+    Roots are hooked onto the smallest root that they share an edge with
+    and pointer jumping then points every node straight at its root, so
+    only a few vectorized rounds are needed.
+
+    `odd` marks the edges whose nodes have opposite parity. The parity of
+    each node relative to the label of its component is returned along
+    with the labels. Edges that disagree with the parity already found
+    for their component are ignored.
+    """
+    labels = np.arange(n)
+    parity = np.zeros(n, dtype=bool)
+    odd = np.zeros(len(a), dtype=bool) if odd is None else odd
+    while True:
+        la, lb = labels[a], labels[b]
+        joins = la != lb
+        if not joins.any():
+            return labels, parity
+
+        # Hook each root onto the smallest root it touches
+        lo, hi = np.minimum(la, lb)[joins], np.maximum(la, lb)[joins]
+        relative = (parity[a] ^ parity[b] ^ odd)[joins]
+        order = np.lexsort((lo, hi))
+        hi, lo, relative = hi[order], lo[order], relative[order]
+        first = np.concatenate([[True], hi[1:] != hi[:-1]])
+        labels[hi[first]] = lo[first]
+        parity[hi[first]] = relative[first]
+
+        while True:
+            roots = labels[labels]
+            if np.all(roots == labels):
+                break
+            parity = parity ^ parity[labels]
+            labels = roots
+
+def _cell_hash(keys):
+    "Hash (N,3) integer grid cells into single int64 values. Different cells can share a hash."
+    return (keys[:, 0]*73856093) ^ (keys[:, 1]*19349663) ^ (keys[:, 2]*83492791)
+
+def weld_vertices(vertices, faces, tolerance=1e-6):
+    """Merge vertices that are within `tolerance` of each other.
+
+    Exact copies are merged first. The remaining points are hashed into
+    a grid of `tolerance` sized cells and each point is compared with
+    the points in its own cell and in the neighbouring cells, found with
+    sorted 1-D lookups of the hashes. Vertices that are joined by a
+    chain of close vertices are replaced with the first of them. Returns
+    the new vertices and faces.
+    """
+    order = np.lexsort(vertices.T[::-1])
+    distinct = np.concatenate([[True], np.any(vertices[order][1:] != vertices[order][:-1], axis=1)])
+    copies = np.empty(len(vertices), dtype=int)
+    copies[order] = np.cumsum(distinct) - 1
+    points = vertices[order[distinct]]
+
+    keys = np.floor(points/tolerance).astype(np.int64)
+    hashes = _cell_hash(keys)
+    order = np.argsort(hashes, kind="stable")
+    hashes = hashes[order]
+    starts = np.flatnonzero(np.concatenate([[True], hashes[1:] != hashes[:-1]]))
+    counts = np.diff(np.append(starts, len(hashes)))
+    cells = keys[order[starts]]
+
+    pairs = []
+    for offset in product((-1, 0, 1), repeat=3):
+        # Look each way once, and within the same cell
+        if offset < (0, 0, 0):
+            continue
+        target = _cell_hash(cells + offset)
+        neighbour = np.minimum(np.searchsorted(hashes[starts], target), len(starts)-1)
+        c1 = np.nonzero(hashes[starts][neighbour] == target)[0]
+        c2 = neighbour[c1]
+
+        # Every point of each cell against every point of its neighbour
+        n1, n2 = counts[c1], counts[c2]
+        pair = np.repeat(np.arange(len(c1)), n1*n2)
+        local = np.arange(len(pair)) - np.repeat(np.cumsum(n1*n2) - n1*n2, n1*n2)
+        i, j = local // n2[pair], local % n2[pair]
+        if offset == (0, 0, 0):
+            pair, i, j = pair[i < j], i[i < j], j[i < j]
+        a, b = order[starts[c1][pair] + i], order[starts[c2][pair] + j]
+
+        # Hashes can collide, so check the cells as well as the distances
+        close = np.all(keys[b] == keys[a] + offset, axis=1) & (segment_lengths(points[a], points[b]) <= tolerance)
+        pairs.append(np.stack([a[close], b[close]]))
+    a, b = np.concatenate(pairs, axis=1)
+
+    labels, _ = connected_components(len(points), a, b)
+    _, first, inverse = np.unique(labels[copies], return_index=True, return_inverse=True)
+    remap = np.empty(len(first), dtype=int)
+    remap[np.argsort(first)] = np.arange(len(first))
+    return vertices[np.sort(first)], remap[inverse.reshape(-1)][faces]
+
+def remove_degenerate_faces(faces):
+    "Remove faces that repeat a vertex or duplicate another face."
+    faces = faces[(faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) & (faces[:, 2] != faces[:, 0])]
+    _, first = np.unique(np.sort(faces, axis=1), axis=0, return_index=True)
+    return faces[np.sort(first)]
+
+def orient_faces(faces, adj):
+    """Flip faces so that neighbouring faces agree on their winding.
+
+    Each connected component keeps the winding of its first face.
+    Returns the new faces and a mask of the faces that were flipped.
+    """
+    manifold = np.nonzero(adj.edge_counts == 2)[0]
+    f1, f2 = adj.edge_faces[manifold].T
+    d1 = adj.forward[f1, np.argmax(adj.face_edges[f1] == manifold[:, None], axis=1)]
+    d2 = adj.forward[f2, np.argmax(adj.face_edges[f2] == manifold[:, None], axis=1)]
+
+    # Faces that traverse their shared edge the same way have opposite windings
+    _, flip = connected_components(len(faces), f1, f2, odd=d1 == d2)
+    faces = faces.copy()
+    faces[flip] = faces[flip][:, ::-1]
+    return faces, flip
+
+def orient_outwards(vertices, faces, adj):
+    """Flip each connected component of faces that encloses a negative volume, so that it faces outwards.
+
+    The volume is measured about the centroid of each component, but is
+    only reliable once the component is closed. Returns the new faces
+    and a mask of the faces that were flipped.
+    """
+    shared = adj.edge_counts >= 2
+    labels, _ = connected_components(len(faces), adj.edge_faces[shared, 0], adj.edge_faces[shared, 1])
+    tris = vertices[faces]
+
+    counts = np.bincount(labels, minlength=len(faces))
+    centroids = np.zeros((len(faces), 3))
+    np.add.at(centroids, labels, tris.mean(axis=1))
+    centroids /= np.maximum(counts, 1)[:, None]
+
+    tris = tris - centroids[labels][:, None]
+    volumes = np.zeros(len(faces))
+    np.add.at(volumes, labels, np.sum(tris[:, 0]*np.cross(tris[:, 1], tris[:, 2]), axis=1))
+
+    flip = volumes[labels] < 0
+    faces = faces.copy()
+    faces[flip] = faces[flip][:, ::-1]
+    return faces, flip
+
+def boundary_loops(faces, adj):
+    """Trace the loops of boundary edges around each hole.
+
+    Returns a list of vertex index arrays, ordered in the direction of
+    the faces that border the hole, and the number of boundary edges
+    that could not be traced into a simple loop.
+    """
+    boundary = adj.boundary_edges
+    if len(boundary) == 0:
+        return [], 0
+
+    # Directed boundary half-edges as they are traversed by their face
+    face = adj.edge_faces[boundary, 0]
+    k = np.argmax(adj.face_edges[face] == boundary[:, None], axis=1)
+    starts, ends = faces[face, k], faces[face, (k+1)%3]
+
+    unique_starts, counts = np.unique(starts, return_counts=True)
+    if np.any(counts > 1):
+        # Holes that touch at a vertex are ambiguous to trace
+        ambiguous = np.isin(starts, unique_starts[counts > 1])
+        starts, ends = starts[~ambiguous], ends[~ambiguous]
+    next_vertex = dict(zip(starts.tolist(), ends.tolist()))
+
+    loops, used = [], set()
+    for start in starts.tolist():
+        if start in used:
+            continue
+        loop = [start]
+        used.add(start)
+        v = next_vertex[start]
+        while v != start and v in next_vertex and v not in used:
+            loop.append(v)
+            used.add(v)
+            v = next_vertex[v]
+        if v == start and len(loop) >= 3:
+            loops.append(np.array(loop))
+
+    return loops, len(boundary) - sum(len(l) for l in loops)
+
+def fill_holes(faces, adj):
+    """Close each simple hole with a fan of triangles.
+
+    Returns the new faces, the number of holes that were filled and
+    the number of boundary edges that are left open.
+    """
+    loops, open_edges = boundary_loops(faces, adj)
+    if len(loops) == 0:
+        return faces, 0, open_edges
+
+    # Wind the new triangles against the direction of the boundary
+    new_faces = [np.stack([np.full(len(loop)-2, loop[0]), loop[2:], loop[1:-1]], axis=1) for loop in loops]
+    return np.concatenate([faces] + new_faces), len(loops), open_edges
+
+def repair_mesh(vertices, faces, tolerance=1e-6):
+    """
+    Weld, clean, orient and close a mesh so that it can be sliced.
+
+    Arguments:
+
+    vertices (np.ndarray)
+        (V,3) array of vertex coordinates.
+    faces (list or np.ndarray)
+        Vertex indices of each face. Polygons are triangulated.
+    tolerance (float)
+        Vertices closer than this are merged.
+        Default: 1e-6
+
+    Returns the repaired vertices and (F,3) faces, the `Adjacency` of
+    the repaired mesh and a `MeshReport` of what was found and fixed.
+    """
+    report = MeshReport()
+    triangles = triangulate(faces)
+    report.triangulated_faces = len(triangles) - len(faces)
+
+    welded, triangles = weld_vertices(vertices, triangles, tolerance)
+    report.welded_vertices = len(vertices) - len(welded)
+
+    n_faces = len(triangles)
+    triangles = remove_degenerate_faces(triangles)
+    report.removed_faces = n_faces - len(triangles)
+
+    adj = Adjacency(triangles)
+    triangles, flipped = orient_faces(triangles, adj)
+    adj = Adjacency(triangles)
+
+    triangles, report.filled_holes, report.open_edges = fill_holes(triangles, adj)
+    if report.filled_holes > 0:
+        adj = Adjacency(triangles)
+
+    # Which way is out can only be told once the holes are closed
+    triangles, outwards = orient_outwards(welded, triangles, adj)
+    if outwards.any():
+        adj = Adjacency(triangles)
+    report.flipped_faces = int(np.sum(flipped ^ outwards[:len(flipped)]))
+    report.non_manifold_edges = len(adj.non_manifold_edges)
+
+    if not report.watertight:
+        logger.warning(f"Mesh could not be fully repaired and may slice incorrectly. {report}")
+    elif any(v != 0 for k,v in vars(report).items() if k != "triangulated_faces"):
+        logger.info(f"Repaired mesh. {report}")
+
+    return welded, triangles, adj, report
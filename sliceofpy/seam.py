@@ -0,0 +1,98 @@
+import numpy as np
+
+from .math_utils import cross_2d
+
+# Ways of choosing where each closed loop starts and ends
+SEAM_MODES = ["aligned", "nearest", "hidden"]
+
+def turning_angles(loop):
+    """The signed angle that a closed (k+1,2+) `loop` turns through at each of its k vertices.
+
+    Left turns are positive. The first point of the loop is repeated at
+    its end. Repeated points turn through an angle of 0 and the turn is
+    given to the vertex that they repeat.
+    """
+    pts = loop[:-1, :2]
+    distinct = np.any(pts != np.roll(pts, 1, axis=0), axis=1)
+    angles = np.zeros(len(pts))
+    if distinct.sum() < 3:
+        return angles
+
+    corners = pts[distinct]
+    incoming = corners - np.roll(corners, 1, axis=0)
+    outgoing = np.roll(corners, -1, axis=0) - corners
+    angles[distinct] = np.arctan2(cross_2d(incoming, outgoing), np.sum(incoming*outgoing, axis=1))
+    return angles
+
+def seam_reference(bounds):
+    "The point behind the middle of the back of `bounds` that aligned seams are drawn towards."
+    x_min, x_max, y_min, y_max = bounds[:4]
+    return np.array([(x_min+x_max)/2, y_max + (y_max-y_min) + 1])
+
+def seam_scores(loop, mode, reference, position=None, hole=False, corner_angle=np.pi/6):
+    """
+    Score each vertex of a closed `loop` as the place to start it. The
+    vertex with the lowest score is the seam.
+
+    Arguments:
+
+    loop (np.ndarray)
+        (k+1,2+) array of the points of the loop. The first point is
+        repeated at the end.
+    mode (str)
+        One of ["aligned", "nearest", "hidden"].
+        "aligned" starts at the vertex closest to `reference`, so that
+        the seams of every layer line up.
+        "nearest" starts at the vertex closest to `position`.
+        "hidden" starts at the sharpest concave corner of the part,
+        then at the sharpest convex corner, and otherwise as "aligned".
+    reference (np.ndarray)
+        The point that aligned seams are drawn towards.
+    position (np.ndarray)
+        The position of the nozzle. "nearest" behaves as "aligned" when
+        it is None.
+        Default: None
+    hole (bool)
+        Whether the loop is the boundary of a hole, with the part
+        outside of it rather than inside.
+        Default: False
+    corner_angle (float)
+        The smallest turn in radians that counts as a corner when hiding
+        seams.
+        Default: pi/6
+    """
+    if mode not in SEAM_MODES:
+        raise ValueError(f"Seam mode not recognized: {mode}. Use any of {SEAM_MODES}")
+
+    pts = loop[:-1, :2]
+    target = position if mode == "nearest" and position is not None else reference
+    distances = np.hypot(*(pts - np.asarray(target)[:2]).T)
+    if mode != "hidden":
+        return distances
+
+    # Turns towards the part are convex and turns away from it are concave
+    angles = turning_angles(loop)
+    angles *= np.sign(angles.sum()) * (-1 if hole else 1)
+    scores = 0.1*distances/max(distances.max(), 1e-12)
+    scores[angles > corner_angle] -= 1
+    concave = angles < -corner_angle
+    scores[concave] -= 2 - angles[concave]
+    return scores
+
+def rotate_loop(loop, start):
+    "Rotate a closed `loop` so that it starts and ends at its vertex `start`."
+    pts = np.roll(loop[:-1], -start, axis=0)
+    return np.concatenate([pts, pts[:1]])
+
+def place_seams(toolpaths, mode, reference, position=None, corner_angle=np.pi/6):
+    """Start each closed toolpath at the seam chosen by `seam_scores`.
+
+    The toolpaths are changed in place and in order, so that "nearest"
+    seams are placed relative to the end of the previous toolpath.
+    """
+    for tp in toolpaths:
+        if tp.closed and len(tp) > 2:
+            scores = seam_scores(tp.points, mode, reference, position, tp.hole, corner_angle)
+            tp.points = rotate_loop(tp.points, np.argmin(scores))
+        position = tp.points[-1]
+    return toolpaths
@@ -0,0 +1,191 @@
+import numpy as np
+import os
+
+from .mesh import Adjacency, repair_mesh, triangulate
+from .slicer import layer_contours
+from .toolpath import contour_loop, contour_containment
+
+class Section():
+    """
+    The cross section of a mesh at height `z`.
+
+    All the closed loops of the section are stored in one array. Islands
+    are wound counter-clockwise and holes clockwise.
+
+    Attributes:
+
+    z (float)
+        The height of the section.
+    points (np.ndarray)
+        (N,2) array of the points of every loop, one loop after another.
+        The first point of a loop is not repeated at its end.
+    offsets (np.ndarray)
+        (L+1,) array of the index in `points` where each loop starts.
+    parents (np.ndarray)
+        (L,) array of the island that each hole belongs to, or -1 for
+        the outer boundaries of islands.
+    """
+    def __init__(self, z, points, offsets, parents):
+        self.z = z
+        self.points = points
+        self.offsets = offsets
+        self.parents = parents
+
+    @classmethod
+    def from_loops(cls, z, loops):
+        "Build a section from closed (k,2+) `loops`, working out which are islands and which are holes."
+        # Drop repeated points, including the point that closes each loop
+        loops = [loop[np.concatenate([[True], np.any(loop[1:, :2] != loop[:-1, :2], axis=1)])] for loop in loops]
+        loops = [loop[:-1, :2] if np.all(loop[0] == loop[-1]) else loop[:, :2] for loop in loops]
+        loops = [loop for loop in loops if len(loop) >= 3]
+
+        inside = contour_containment([np.concatenate([loop, loop[:1]]) for loop in loops])
+        depths = inside.sum(axis=1)
+
+        # Each hole belongs to the enclosing loop one level up
+        parents = np.full(len(loops), -1)
+        for i in np.nonzero(depths % 2 == 1)[0]:
+            enclosing = np.nonzero(inside[i] & (depths == depths[i]-1))[0]
+            parents[i] = enclosing[0] if len(enclosing) > 0 else -1
+
+        # Wind islands counter-clockwise and holes clockwise
+        loops = [loop[::-1] if (signed_area(loop) > 0) == (parent >= 0) else loop for loop, parent in zip(loops, parents)]
+
+        offsets = np.concatenate([[0], np.cumsum([len(loop) for loop in loops])]).astype(int)
+        points = np.concatenate(loops) if len(loops) > 0 else np.empty((0, 2))
+        return cls(z, points, offsets, parents)
+
+    def __len__(self):
+        return len(self.parents)
+
+    def loop(self, i):
+        "The (k,2) points of loop `i`."
+        return self.points[self.offsets[i]:self.offsets[i+1]]
+
+    @property
+    def loops(self):
+        return [self.loop(i) for i in range(len(self))]
+
+    def islands(self):
+        "A list of (outer boundary, [holes]) for each island."
+        return [(self.loop(i), [self.loop(j) for j in np.nonzero(self.parents == i)[0]])
+                for i in np.nonzero(self.parents == -1)[0]]
+
+    def area(self):
+        "The area enclosed by the section, excluding holes."
+        if len(self) == 0:
+            return 0.
+        # Shoelace formula over all loops at once
+        nxt = np.arange(1, len(self.points)+1)
+        nxt[self.offsets[1:]-1] = self.offsets[:-1]
+        cross = self.points[:, 0]*self.points[nxt, 1] - self.points[nxt, 0]*self.points[:, 1]
+        return np.add.reduceat(cross, self.offsets[:-1]).sum()/2
+
+    def to_svg_path(self):
+        "The section as the `d` attribute of an SVG path."
+        return " ".join("M " + " L ".join(f"{x:.6f} {y:.6f}" for x, y in loop) + " Z" for loop in self.loops)
+
+    def to_svg(self, bounds=None, fill="black"):
+        """
+        The section as an SVG document in model units.
+
+        `bounds` is the (x_min, x_max, y_min, y_max) of the view box and
+        defaults to the bounds of the section. The y-axis is flipped so
+        that the section is drawn as seen from above.
+        """
+        if bounds is None:
+            x_min, y_min = self.points.min(axis=0) if len(self.points) > 0 else (0, 0)
+            x_max, y_max = self.points.max(axis=0) if len(self.points) > 0 else (0, 0)
+        else:
+            x_min, x_max, y_min, y_max = bounds
+        width, height = x_max-x_min, y_max-y_min
+        return (f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="{x_min} {-y_max} {width} {height}" '
+                f'width="{width}mm" height="{height}mm">\n'
+                f'<path transform="scale(1,-1)" fill="{fill}" fill-rule="evenodd" d="{self.to_svg_path()}"/>\n'
+                f'</svg>\n')
+
+    def __str__(self):
+        return f"Section z={self.z}: {np.sum(self.parents == -1)} islands, {np.sum(self.parents >= 0)} holes"
+
+    def __repr__(self):
+        return str(self)
+
+def signed_area(loop):
+    "The signed area of a (k,2) loop. Positive when it is wound counter-clockwise."
+    x, y = loop[:, 0], loop[:, 1]
+    return (np.dot(x, np.roll(y, -1)) - np.dot(np.roll(x, -1), y))/2
+
+def iter_slices(vertices, faces, heights, repair=True):
+    """
+    Lazily slice a mesh at each of `heights`, yielding a `Section` per height.
+
+    Arguments:
+
+    vertices (np.ndarray)
+        (V,3) array of vertex coordinates.
+    faces (list or np.ndarray)
+        Vertex indices of each face.
+    heights (iterable)
+        The z values to slice at.
+    repair (bool)
+        Repair the mesh with `repair_mesh` before slicing.
+        Default: True
+    """
+    vertices = np.asarray(vertices, dtype=float)
+    if repair:
+        vertices, faces, adj, _ = repair_mesh(vertices, faces)
+    else:
+        adj = Adjacency(triangulate(faces))
+
+    for z in heights:
+        loops = [contour_loop(face_q) for face_q in layer_contours(vertices, adj, z) if len(face_q) > 0]
+        yield Section.from_loops(z, loops)
+
+def slice_mesh(vertices, faces, heights, repair=True):
+    "Slice a mesh at each of `heights` without generating any G-code. See `iter_slices`."
+    return list(iter_slices(vertices, faces, heights, repair))
+
+def save_svg(sections, directory, bounds=None):
+    """Save each section as an SVG file in `directory`.
+
+    All sections share the same `bounds`, which default to the bounds of
+    all the sections. Returns the list of filenames in order.
+    """
+    os.makedirs(directory, exist_ok=True)
+    if bounds is None:
+        points = np.concatenate([s.points for s in sections] + [np.zeros((0, 2))])
+        x_min, y_min = points.min(axis=0) if len(points) > 0 else (0, 0)
+        x_max, y_max = points.max(axis=0) if len(points) > 0 else (0, 0)
+        bounds = (x_min, x_max, y_min, y_max)
+
+    filenames = []
+    for i, section in enumerate(sections):
+        filenames.append(os.path.join(directory, f"layer_{i:05d}.svg"))
+        with open(filenames[-1], "w") as f:
+            f.write(section.to_svg(bounds))
+    return filenames
+
+def save_npz(sections, filename):
+    """Save sections into a single compressed NumPy file.
+
+    The loops of every section are concatenated, with `layer_offsets`
+    giving the first loop of each section.
+    """
+    counts = [len(s.points) for s in sections]
+    np.savez_compressed(filename,
+        z=np.array([s.z for s in sections], dtype=float),
+        points=np.concatenate([s.points for s in sections] + [np.zeros((0, 2))]),
+        offsets=np.concatenate([[0]] + [s.offsets[1:] + start for s, start in zip(sections, np.cumsum([0] + counts[:-1]))]).astype(int),
+        parents=np.concatenate([s.parents for s in sections] + [np.zeros(0, dtype=int)]).astype(int),
+        layer_offsets=np.cumsum([0] + [len(s) for s in sections]).astype(int))
+
+def load_npz(filename):
+    "Load the sections saved with `save_npz`."
+    data = np.load(filename)
+    offsets, layer_offsets = data["offsets"], data["layer_offsets"]
+    sections = []
+    for i, z in enumerate(data["z"]):
+        loop_offsets = offsets[layer_offsets[i]:layer_offsets[i+1]+1]
+        sections.append(Section(z, data["points"][loop_offsets[0]:loop_offsets[-1]], loop_offsets - loop_offsets[0],
+                                data["parents"][layer_offsets[i]:layer_offsets[i+1]]))
+    return sections
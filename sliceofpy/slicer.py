@@ -1,10 +1,15 @@
 import numpy as np
 import logging, os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import matplotlib.pyplot as plt
 
-from .math_utils import get_intersection, distance_between
-from .infill import solid, criss_cross, gap_fill, Axis
+from .math_utils import intersect_segments
+from .infill import Axis
 from .draw import G
+from .mesh import repair_mesh
+from .support import support_layers
+from .toolpath import layer_toolpaths, feature_speeds, layer_speeds, write_toolpaths, Retraction
 
 logger = logging.getLogger(__name__)
 logging.basicConfig()
@@ -39,46 +44,12 @@ class Face():
         return str(self)
 
 class FaceQueue():
+    "The faces crossed by a closed contour, in the order that they are traced."
     def __init__(self):
         self.q = []
-        self.store = []
-
-    def get_matches(self, face):
-        return sum(f in face.v for f in self.q[-1].v)
-
-    def check_closed(self):
-        "Checks if the contour is closed."
-        return len(self)>2 and self.get_matches(self.q[0]) == 2
-
-    def insert(self, face):
-        "Returns True when the contour is complete"
-        if len(self.q) == 0:
-            self.q.append(face)
-        else:
-            matches = self.get_matches(face)
-            if matches < 2:
-                # Push to store if fewer than 2 vertices match
-                self.store.append(face)
-            elif matches ==2:
-                # Append to q if there is one edge match
-                self.q.append(face)
-
-            if len(self.store) > 0:
-                added_from_store = False
-                while True:
-                    for f in self.store:
-                        if self.get_matches(f) >= 2:
-                            self.q.append(f)
-                            added_from_store = True
-                            break
-
-                    if added_from_store:
-                        self.store.remove(f)
-                        added_from_store = False
-                    else:
-                        break
-
-        return self.check_closed()
+
+    def append(self, face):
+        self.q.append(face)
 
     def __len__(self):
         return len(self.q)
@@ -115,10 +86,6 @@ def parse_obj(filename):
 
     return faces, vertices
 
-def is_lower_point(vert_zs, zi):
-    "UNUSED: Meant to check if only a single point touches the contour (and thus should be ignored)"
-    return sum(vert_zs == zi) == 1 and sum(vert_zs<zi) == 0
-
 def center_vertices(vertices, base_offset):
     "Corrects any offsets in the vertices for better printing."
     x_min,y_min,z_min = vertices.min(axis=0)
@@ -150,57 +117,147 @@ def center_vertices(vertices, base_offset):
     return z_max
 
 
-def generate_contours(filename, layer_height, scale, base_offset):
-    "Find the contours of all the intersecting vertices"
-    faces, vertices = parse_obj(filename)
-    z_max = center_vertices(vertices, base_offset)
+def layer_contours(vertices, adj, zi):
+    """Find the closed contours where the plane at height `zi` cuts the mesh.
 
-    num_slices = int(np.ceil((z_max-base_offset)*scale/layer_height))
-    logger.info(f"Number of slices: {num_slices}")
-
-    face_qs = []
+    Each crossed face has exactly two crossed edges, so the contour is
+    traced by stepping from face to face across the shared crossed edge
+    using the adjacency table. Returns a list of `FaceQueue`s, one per
+    contour, with the faces in contour order.
+    """
+    is_lower = vertices[:, 2] <= zi
+    lows, upps = adj.edges.T
+    crossing = is_lower[lows] != is_lower[upps]
+
+    # Intersect each crossed edge once, oriented from the lower to the upper
+    # vertex, so that neighbouring faces share exactly the same contour point.
+    edge_lower = is_lower[lows][crossing]
+    low_verts = np.where(edge_lower, lows[crossing], upps[crossing])
+    upp_verts = np.where(edge_lower, upps[crossing], lows[crossing])
+    contour_pts = np.full((len(adj.edges), 3), np.nan)
+    contour_pts[crossing] = intersect_segments(vertices[low_verts], vertices[upp_verts], Axis.Z, zi)
+
+    # The two crossed edges of every crossed face
+    face_crossing = crossing[adj.face_edges]
+    crossed_faces = np.nonzero(face_crossing.any(axis=1))[0]
+    first = np.argmax(face_crossing, axis=1)
+    second = 2 - np.argmax(face_crossing[:, ::-1], axis=1)
+    crossed_edges = np.stack([adj.face_edges[np.arange(len(first)), first],
+                              adj.face_edges[np.arange(len(second)), second]], axis=1)
+
+    # Start open contours (around holes) at their ends, then trace the closed ones
+    open_ends = (adj.edge_faces[crossed_edges[crossed_faces]] == -1).any(axis=(1,2))
+    starts = np.concatenate([crossed_faces[open_ends], crossed_faces[~open_ends]])
+
+    visited = np.zeros(len(adj.faces), dtype=bool)
+    layer_fqs = []
+    for start in starts:
+        if visited[start]:
+            continue
 
-    for i in range(num_slices):
-        zi = i*layer_height + base_offset
-        layer_fqs = []
         face_q = FaceQueue()
+        f = start
+        e_in, e_out = crossed_edges[f]
+        if adj.neighbor(f, e_out) == -1:
+            e_in, e_out = e_out, e_in
+
+        while f != -1 and not visited[f]:
+            visited[f] = True
+            face = Face(adj.faces[f], f)
+            face.add_contour_pts(contour_pts[e_in])
+            face.add_contour_pts(contour_pts[e_out])
+            face_q.append(face)
+
+            f = adj.neighbor(f, e_out)
+            if f != -1:
+                e_in = e_out
+                e_out = crossed_edges[f, 0] if crossed_edges[f, 1] == e_in else crossed_edges[f, 1]
+
         layer_fqs.append(face_q)
 
-        # Find all the vertices intersecting with this z-plane
-        # Then generate contours
-        for face_num,face in enumerate(faces):
-            current_verts = vertices[face]
-            current_zs = current_verts[:, 2]
+    return layer_fqs
 
-            lowers = current_verts[current_zs <= zi]
-            uppers = current_verts[current_zs > zi]
-            if len(lowers) != 0 and len(uppers) != 0: # and not is_lower_point(current_zs, zi):
-                # add face to list of intersected faces
-                f_class = Face(face, face_num)
+def load_mesh(filename, scale=1, base_offset=0.1):
+    "Parse, repair, scale and center a mesh. Returns its vertices and the `Adjacency` of its faces."
+    faces, vertices = parse_obj(filename)
+    vertices, faces, adj, report = repair_mesh(vertices, faces)
+    vertices *= scale
+    center_vertices(vertices, base_offset)
+    return vertices, adj
+
+def slice_layers(vertices, adj, layer_height, base_offset):
+    "Find the contours of every layer of a mesh, starting at `base_offset`."
+    num_slices = int(np.ceil((vertices[:, 2].max()-base_offset)/layer_height))
+    logger.info(f"Number of slices: {num_slices}")
+    return [layer_contours(vertices, adj, i*layer_height + base_offset) for i in range(num_slices)]
 
-                # process face
-                for low_vert in lowers:
-                    for upp_vert in uppers:
-                        contour_pt = get_intersection(low_vert, upp_vert, z=zi)
-                        f_class.add_contour_pts(contour_pt)
+def generate_contours(filename, layer_height, scale, base_offset):
+    "Find the contours of all the intersecting vertices"
+    vertices, adj = load_mesh(filename, scale, base_offset)
+    return slice_layers(vertices, adj, layer_height, base_offset), vertices
+
+def xy_bounds(vertices):
+    "The (x_min, x_max, y_min, y_max) bounds of `vertices` on the plate."
+    x_min, y_min = vertices[:, :2].min(axis=0)
+    x_max, y_max = vertices[:, :2].max(axis=0)
+    return (x_min, x_max, y_min, y_max)
+
+class PlateObject():
+    "A sliced object on the plate, along with its supports and the statistics of printing it."
+    def __init__(self, name, face_qs, vertices, supports=None):
+        self.name = name
+        self.face_qs = face_qs
+        self.supports = supports
+        self.vertices = vertices
+        self.bounds = xy_bounds(vertices)
+        self.total_distance = 0
+        self.total_extruded = 0
 
-                isFqFull = face_q.insert(f_class)
+    def __len__(self):
+        return len(self.face_qs)
 
-                # Push all the remaining stored faces into a new FaceQueue
-                if isFqFull and ((len(face_q.store) > 0) or (face_num < len(faces)-1)):
-                    extra_face_q = FaceQueue()
-                    for f in face_q.store:
-                        extra_face_q.insert(f)
+    def __str__(self):
+        return f"{self.name}: {len(self)} layers, nozzle distance {self.total_distance}mm, filament used {self.total_extruded}mm"
 
-                    face_q.store = []
-                    face_q = extra_face_q
-                    layer_fqs.append(face_q)
-                elif face_num == len(faces)-1:
-                    layer_fqs.append(face_q)
+    def __repr__(self):
+        return str(self)
 
-        face_qs.append(layer_fqs)
+def bounds_overlap(a, b, gap=0):
+    "Whether the (x_min, x_max, y_min, y_max) bounds `a` and `b` are less than `gap` apart."
+    return a[0] < b[1] + gap and b[0] < a[1] + gap and a[2] < b[3] + gap and b[2] < a[3] + gap
 
-    return face_qs, vertices
+def arrange_objects(meshes, placements, spacing):
+    """Translate each mesh to its (x, y) placement on the plate.
+
+    Meshes without a placement are laid out in a row along the x-axis,
+    `spacing` apart, with the row centered at the origin. If the row
+    would come within `spacing` of the placed meshes it is moved along
+    the y-axis to `spacing` in front of them. A warning is logged for
+    each pair of meshes whose bounds overlap.
+    """
+    placed = [i for i, placement in enumerate(placements) if placement is not None]
+    for i in placed:
+        meshes[i][0][:, :2] += placements[i]
+
+    unplaced = [i for i, placement in enumerate(placements) if placement is None]
+    widths = [np.ptp(meshes[i][0][:, 0]) for i in unplaced]
+    x = -(sum(widths) + spacing*(len(widths)-1))/2
+    for i, width in zip(unplaced, widths):
+        meshes[i][0][:, 0] += x + width/2
+        x += width + spacing
+
+    if len(unplaced) > 0 and len(placed) > 0:
+        row = xy_bounds(np.concatenate([meshes[i][0] for i in unplaced]))
+        if any(bounds_overlap(row, xy_bounds(meshes[i][0]), spacing) for i in placed):
+            y = min(xy_bounds(meshes[i][0])[2] for i in placed) - spacing - row[3]
+            for i in unplaced:
+                meshes[i][0][:, 1] += y
+
+    bounds = [xy_bounds(vertices) for vertices, _ in meshes]
+    for i in range(len(meshes)):
+        for j in range(i+1, len(meshes)):
+            if bounds_overlap(bounds[i], bounds[j]):
+                logger.warning(f"Objects #{i} and #{j} overlap on the plate.")
 
 def process_gcode_template(filename, tmp_name, **kwargs):
     "Process gcode template with necessary kwargs and write into tmp file"
@@ -222,8 +279,11 @@ def process_temp(temp, lookup):
 
 def generate_gcode(filename, outfile="out.gcode", layer_height=0.2, scale=1, plot_slices=False,
     feedrate=3600, feedrate_writing=None, filament_diameter=1.75, extrusion_width=0.4,
-    extrusion_multiplier=1, misc_infill="cross", misc_infill_kwargs={'gap_between_crosses': 5},
-    num_solid_fill=3, temperature="PLA", bed_temperature="PLA", units="mm", base_offset=0.1):
+    extrusion_multiplier=1, misc_infill="grid", misc_infill_kwargs={'density': 0.2},
+    num_solid_fill=3, temperature="PLA", bed_temperature="PLA", units="mm", base_offset=0.1,
+    speeds=None, min_layer_time=0, min_print_speed=600, seam="hidden", retract_length=1, retract_speed=2400,
+    retract_min_travel=2, z_hop=0, coast_distance=0, wipe_distance=0, support=False, support_angle=45,
+    support_density=0.15, support_gap=0.2):
     """
     Generate G-code from an `.obj` file.
 
@@ -262,11 +322,13 @@ def generate_gcode(filename, outfile="out.gcode", layer_height=0.2, scale=1, plo
         Default: 1
     misc_infill (str)
         The type of infill pattern for layers that are not on the
-        top or the bottom. One of ["cross", "solid", "none"].
-        Default: "cross"
+        top or the bottom. One of ["grid", "triangles", "honeycomb",
+        "gyroid", "solid", "none"]. "cross" is an alias of "grid".
+        Default: "grid"
     misc_infill_kwargs (dict)
         Miscellaneous keyword arguments to the misc_infill.
-        Default: {'gap_between_crosses': 5}
+        `density` is the fraction of the area that is filled.
+        Default: {'density': 0.2}
     num_solid_fill (int)
         The number of solid infill layers at the top and bottom
         of the object.
@@ -288,10 +350,139 @@ def generate_gcode(filename, outfile="out.gcode", layer_height=0.2, scale=1, plo
         Offset the base of the design from z=0 so that the
         printer head prints smoothly.
         Default: 0.1
+    speeds (dict)
+        The speed (mm/min) of each printed feature, overriding the
+        defaults. Any of "outer_wall", "solid_infill", "sparse_infill",
+        "support", "first_layer" and "travel". Features print
+        at `feedrate_writing` and travel at `feedrate` by default.
+        The first layer speed applies to every feature on the first
+        layer.
+        Default: None
+    min_layer_time (float)
+        The minimum time in seconds to spend printing each layer.
+        Faster layers are slowed down so that they can cool.
+        Default: 0
+    min_print_speed (float)
+        The slowest speed (mm/min) that a layer is slowed down to
+        in order to reach `min_layer_time`.
+        Default: 600
+    seam (str)
+        Where each wall starts and ends. One of ["aligned", "nearest",
+        "hidden"] or None. "aligned" lines up the seams at the back of
+        the object, "nearest" starts close to the nozzle and "hidden"
+        tucks the seams into corners.
+        Default: "hidden"
+    retract_length (float)
+        The length of filament to retract before travel moves.
+        Default: 1
+    retract_speed (float)
+        The speed at which to retract and prime the filament. (mm/min)
+        Default: 2400
+    retract_min_travel (float)
+        Travel moves shorter than this do not retract.
+        Default: 2
+    z_hop (float)
+        The height to lift the nozzle by while travelling.
+        Default: 0
+    coast_distance (float)
+        The distance at the end of a path before a retraction that is
+        printed without extruding.
+        Default: 0
+    wipe_distance (float)
+        The distance to wipe the nozzle along the start of a wall
+        before a retraction.
+        Default: 0
+    support (bool)
+        Generate supports under overhangs.
+        Default: False
+    support_angle (float)
+        Faces that face downwards more than this many degrees away
+        from vertical are supported.
+        Default: 45
+    support_density (float)
+        The fraction of the area under an overhang that is filled
+        with support.
+        Default: 0.15
+    support_gap (float)
+        The vertical gap between the supports and the surfaces that
+        they support or stand on, so that they can be removed.
+        Default: 0.2
+    """
+    g, _ = generate_plate_gcode([filename], outfile=outfile, layer_height=layer_height, scale=scale, plot_slices=plot_slices,
+        feedrate=feedrate, feedrate_writing=feedrate_writing, filament_diameter=filament_diameter, extrusion_width=extrusion_width,
+        extrusion_multiplier=extrusion_multiplier, misc_infill=misc_infill, misc_infill_kwargs=misc_infill_kwargs,
+        num_solid_fill=num_solid_fill, temperature=temperature, bed_temperature=bed_temperature, units=units, base_offset=base_offset,
+        speeds=speeds, min_layer_time=min_layer_time, min_print_speed=min_print_speed, seam=seam,
+        retract_length=retract_length, retract_speed=retract_speed, retract_min_travel=retract_min_travel,
+        z_hop=z_hop, coast_distance=coast_distance, wipe_distance=wipe_distance, support=support,
+        support_angle=support_angle, support_density=support_density, support_gap=support_gap)
+    return g
+
+def generate_plate_gcode(objects, outfile="out.gcode", layer_height=0.2, scale=1, plot_slices=False,
+    feedrate=3600, feedrate_writing=None, filament_diameter=1.75, extrusion_width=0.4,
+    extrusion_multiplier=1, misc_infill="grid", misc_infill_kwargs={'density': 0.2},
+    num_solid_fill=3, temperature="PLA", bed_temperature="PLA", units="mm", base_offset=0.1,
+    speeds=None, min_layer_time=0, min_print_speed=600, seam="hidden", retract_length=1, retract_speed=2400,
+    retract_min_travel=2, z_hop=0, coast_distance=0, wipe_distance=0, support=False, support_angle=45,
+    support_density=0.15, support_gap=0.2, spacing=5, processes=None):
+    """
+    Generate G-code for a plate of several `.obj` files printed together.
+
+    Each object is sliced independently, in parallel, and the layers of
+    all the objects are interleaved into a single G-code file. On each
+    layer the objects are printed in the order that keeps the travel
+    between them short.
+
+    Arguments
+
+    objects (list)
+        The objects to print. Each is either the name of an .obj file
+        or a tuple of (filename, (x, y)) placing the center of the
+        object at (x, y). Objects without a placement are arranged in
+        a row along the x-axis.
+    spacing (float)
+        The gap between objects that are arranged automatically.
+        Default: 5
+    processes (int)
+        The number of processes used to load and slice the objects.
+        Use 1 to slice in the current process.
+        Default: os.cpu_count()
+
+    All other arguments are the same as `generate_gcode`.
+
+    Returns the `G` object and a list of `PlateObject`s with the
+    statistics of each object.
     """
-    face_qs, vertices = generate_contours(filename, layer_height, scale, base_offset)
+    objects = [(obj, None) if isinstance(obj, str) else obj for obj in objects]
+    filenames = [filename for filename, _ in objects]
+    placements = [placement for _, placement in objects]
+    misc_infill = "grid" if misc_infill == "cross" else misc_infill
+
+    support_args = (layer_height, base_offset, extrusion_width, support_angle, support_density, support_gap)
+    supports = [None]*len(objects)
+    if processes == 1 or len(objects) == 1:
+        meshes = [load_mesh(filename, scale, base_offset) for filename in filenames]
+        arrange_objects(meshes, placements, spacing)
+        face_qs = [slice_layers(vertices, adj, layer_height, base_offset) for vertices, adj in meshes]
+        if support:
+            supports = [support_layers(vertices, adj.faces, *support_args) for vertices, adj in meshes]
+    else:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            meshes = list(executor.map(load_mesh, filenames, repeat(scale), repeat(base_offset)))
+            arrange_objects(meshes, placements, spacing)
+            face_qs = list(executor.map(slice_layers, *zip(*meshes), repeat(layer_height), repeat(base_offset)))
+            if support:
+                supports = list(executor.map(support_layers, [vertices for vertices, _ in meshes], [adj.faces for _, adj in meshes],
+                                             *[repeat(arg) for arg in support_args]))
+
+    # Number the objects so that copies of the same file can be told apart
+    plate = [PlateObject(f"{os.path.basename(filename)} #{i}", layers, vertices, layer_supports)
+             for i, (filename, layers, (vertices, _), layer_supports) in enumerate(zip(filenames, face_qs, meshes, supports))]
+    vertices = np.concatenate([obj.vertices for obj in plate])
 
     feedrate_writing = feedrate_writing or feedrate//2
+    base_speeds = feature_speeds(feedrate, feedrate_writing, speeds)
+    retraction = Retraction(retract_length, retract_speed, retract_min_travel, z_hop, coast_distance, wipe_distance)
     flow_area = extrusion_multiplier*extrusion_width*layer_height
     flowrate = flow_area*feedrate_writing/60
     extrusion_rate = flow_area/(filament_diameter**2/4*np.pi)
@@ -309,54 +500,41 @@ def generate_gcode(filename, outfile="out.gcode", layer_height=0.2, scale=1, plo
 
     with G(outfile=outfile, filament_diameter=filament_diameter, layer_height=layer_height, header="header.tmp", footer="footer.tmp", vertices=vertices) as g:
         g.absolute()
-        for layer_num, layer_qs in enumerate(face_qs):
+        for layer_num in range(max(len(obj) for obj in plate)):
             g.write(f"\n; Printing layer {layer_num}\n; ====================")
-            g.write(f"\n; Printing outline")
-
-            # TODO: Rename `layer` -> `contour`?
-            for layer in layer_qs:
-                for i, face in enumerate(layer):
-                    if i == 0:
-                        # for the first face, check which way to move
-                        if len(layer) > 1 and (all(face.contour_points[0] == layer[1].contour_points[0]) or all(face.contour_points[0] == layer[1].contour_points[1])):
-                            start_pt = face.contour_points[1]
-                            next_pt = face.contour_points[0]
-                        else:
-                            start_pt = face.contour_points[0]
-                            next_pt = face.contour_points[1]
-
-                        g.abs_move(*start_pt, rapid=True, F=feedrate)
-                        last_pt = start_pt
-                    else:
-                        # for the rest of the way just go to the contour pt that isn't the same as the last
-                        next_pt = face.contour_points[1 if all(face.contour_points[0] == last_pt) else 0]
-
-                    # calculate how much to extrude
-                    distance = distance_between(next_pt, last_pt)
-                    total_distance += distance
-                    extrusion_amount = extrusion_rate*distance
-
-                    # move the cursor
-                    g.abs_move(*next_pt, F=feedrate_writing, E=total_extruded+extrusion_amount)
-                    total_extruded += extrusion_amount
-                    last_pt = next_pt
-
-                # connect back to the start
-                distance = distance_between(start_pt, last_pt)
-                total_distance += distance
-                extrusion_amount = extrusion_rate*distance
-                g.abs_move(*start_pt, F=feedrate_writing, E=total_extruded+extrusion_amount)
-                total_extruded += extrusion_amount
-
-            # Add infill
-            # TODO: check if the layer above is smaller and add infill
-            if layer_num < num_solid_fill or layer_num >= len(face_qs) - num_solid_fill or misc_infill == "solid": # or (layer_num != len(face_qs)-1 and check_layer_above(layer, face_qs[layer_num+1])):
-                # TODO: remove global minima for the axis and start at the layer min/max
-                axis = Axis.X if layer_num % 2 == 0 else Axis.Y
-                total_distance, total_extruded = solid(g, layer_qs, axis, vertices[:, axis].min().item(), vertices[:, axis].max().item(), extrusion_rate, total_extruded, total_distance, extrusion_width)
-            elif misc_infill == "cross":
-                total_distance, total_extruded = criss_cross(g, layer_qs, vertices[:, Axis.X].min().item(), vertices[:, Axis.X].max().item(), vertices[:, Axis.Y].min().item(), vertices[:, Axis.Y].max().item(), extrusion_rate, total_extruded, total_distance, extrusion_width, **misc_infill_kwargs)
 
+            # Greedily print the object that starts closest to the nozzle next, planning
+            # each remaining object from where the previous one ends
+            position = np.array([g.X or 0, g.Y or 0, g.Z or 0])
+            remaining = [obj for obj in plate if layer_num < len(obj)]
+            ordered = []
+            while remaining:
+                planned = [(obj, layer_toolpaths(obj.face_qs[layer_num], layer_num, len(obj), obj.bounds, extrusion_width,
+                                misc_infill, misc_infill_kwargs, num_solid_fill, seam, position,
+                                obj.supports[layer_num] if obj.supports is not None else None)) for obj in remaining]
+                planned = [(obj, toolpaths) for obj, toolpaths in planned if len(toolpaths) > 0]
+                if len(planned) == 0:
+                    break
+                i = np.argmin([np.hypot(*(toolpaths[0].points[0, :2] - position[:2])) for _, toolpaths in planned])
+                ordered.append(planned.pop(i))
+                remaining = [obj for obj, _ in planned]
+                position = ordered[-1][1][-1].points[-1]
+
+            speeds = layer_speeds(base_speeds, layer_num, [tp for _, toolpaths in ordered for tp in toolpaths],
+                                  min_layer_time, min_print_speed, position=[g.X or 0, g.Y or 0, g.Z or 0])
+            for i, (obj, toolpaths) in enumerate(ordered):
+                if len(plate) > 1:
+                    g.write(f"\n; Printing object {obj.name}")
+                start_distance, start_extruded = total_distance, total_extruded
+                next_start = ordered[i+1][1][0].points[0] if i+1 < len(ordered) else None
+                total_distance, total_extruded = write_toolpaths(g, toolpaths, speeds, extrusion_rate, total_extruded, total_distance,
+                                                                 retraction, next_start)
+                obj.total_distance += total_distance - start_distance
+                obj.total_extruded += total_extruded - start_extruded
+
+        if len(plate) > 1:
+            for obj in plate:
+                logger.info(f"Object {obj}")
         logger.info(f"Total nozzle distance: {total_distance}mm")
         logger.info(f"Estimated filament used: {total_extruded}mm")
         # logger.info(f"Total volume: {}mm^3")
@@ -366,4 +544,4 @@ def generate_gcode(filename, outfile="out.gcode", layer_height=0.2, scale=1, plo
         g.plot3d()
         # g.plot2d()
 
-    return g
+    return g, plate
@@ -0,0 +1,182 @@
+import numpy as np
+import logging
+
+from .math_utils import cross_2d
+
+logger = logging.getLogger(__name__)
+
+def face_normals(vertices, faces):
+    "The (F,3) unit normals of the (F,3) triangle `faces`, pointing out of a mesh wound counter-clockwise."
+    tris = vertices[faces]
+    normals = np.cross(tris[:, 1]-tris[:, 0], tris[:, 2]-tris[:, 0])
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+def overhang_faces(vertices, faces, angle=45):
+    "Whether each face faces downwards more than `angle` degrees away from vertical and needs support."
+    return face_normals(vertices, faces)[:, 2] < -np.sin(np.radians(angle))
+
+def rasterize_faces(vertices, faces, origin, cell_size, shape):
+    """
+    Find every face above or below the center of each cell of a grid.
+
+    All the faces are rasterized at once by expanding each face into the
+    cells of its bounding box and keeping the cells whose centers are
+    inside of the face.
+
+    Arguments:
+
+    vertices (np.ndarray)
+        (V,3) array of vertex coordinates.
+    faces (np.ndarray)
+        (F,3) array of the vertex indices of each triangle.
+    origin (np.ndarray)
+        The (x, y) corner of the grid.
+    cell_size (float)
+        The width of each square cell.
+    shape (tuple)
+        The (ny, nx) number of cells along y and x.
+
+    Returns the flat index of the cell, the height of the face above the
+    cell center and the index of the face, for each cell that a face covers.
+    """
+    tris = vertices[faces]
+    ny, nx = shape
+    # The range of cell centers inside of the bounding box of each face
+    lo = np.ceil((tris[:, :, :2].min(axis=1) - origin)/cell_size - 0.5).astype(int)
+    hi = np.floor((tris[:, :, :2].max(axis=1) - origin)/cell_size - 0.5).astype(int)
+    lo, hi = np.maximum(lo, 0), np.minimum(hi, [nx-1, ny-1])
+    extent = np.maximum(hi - lo + 1, 0)
+    counts = extent[:, 0]*extent[:, 1]
+
+    face = np.repeat(np.arange(len(faces)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ci = lo[face, 0] + local % np.maximum(extent[face, 0], 1)
+    cj = lo[face, 1] + local // np.maximum(extent[face, 0], 1)
+    centers = origin + (np.column_stack([ci, cj]) + 0.5)*cell_size
+
+    # Barycentric coordinates of each cell center in its face
+    a, b, c = tris[face, 0], tris[face, 1], tris[face, 2]
+    v0, v1, v2 = b[:, :2]-a[:, :2], c[:, :2]-a[:, :2], centers-a[:, :2]
+    den = cross_2d(v0, v1)
+    u = np.divide(cross_2d(v2, v1), den, out=np.full(len(den), -1.), where=den != 0)
+    v = np.divide(cross_2d(v0, v2), den, out=np.full(len(den), -1.), where=den != 0)
+    inside = (u >= 0) & (v >= 0) & (u + v <= 1)
+
+    z = a[:, 2] + u*(b[:, 2]-a[:, 2]) + v*(c[:, 2]-a[:, 2])
+    return (cj*nx + ci)[inside], z[inside], face[inside]
+
+def support_spans(cells, z, up, overhang, gap):
+    """The (bottom, top) heights of support below each overhanging hit of a face above a cell.
+
+    Support runs down from `gap` below the overhang to `gap` above the
+    nearest upward facing surface below it, or to the bed if there is none.
+    """
+    # Upward facing hits come first where surfaces touch, so that support stops on them
+    order = np.lexsort((~up, z, cells))
+    cells, z, up, overhang = cells[order], z[order], up[order], overhang[order]
+
+    # The nearest upward facing hit below each hit in the same column
+    below = np.maximum.accumulate(np.where(up, np.arange(len(z)), -1))
+    below = np.concatenate([[-1], below[:-1]])
+    floor = np.where((below >= 0) & (cells[np.maximum(below, 0)] == cells), z[np.maximum(below, 0)], -np.inf)
+
+    return cells[overhang], floor[overhang] + gap, z[overhang] - gap
+
+def support_layers(vertices, faces, layer_height, base_offset, extrusion_width=0.4, angle=45, density=0.15, gap=0.2):
+    """
+    Generate support under the overhangs of a mesh, as a list of paths for each layer.
+
+    The mesh is rasterized onto a grid of `extrusion_width` cells once.
+    Each cell that needs support adds itself to the layer that its
+    support starts on and removes itself from the layer above where it
+    ends. Sweeping up through the layers and accumulating these changes
+    gives the cells to support on each layer, so the work grows linearly
+    with the number of layers. Supports are printed as lines along x and
+    y on alternate layers.
+
+    Arguments:
+
+    vertices (np.ndarray)
+        (V,3) array of vertex coordinates.
+    faces (np.ndarray)
+        (F,3) array of triangles, wound counter-clockwise from outside.
+    layer_height (float)
+        The height of the layers.
+    base_offset (float)
+        The height of the first layer.
+    extrusion_width (float)
+        The width of the support lines and of the cells of the grid.
+        Default: 0.4
+    angle (float)
+        Faces that face downwards more than `angle` degrees away from
+        vertical are supported.
+        Default: 45
+    density (float)
+        The fraction of the area under an overhang that is filled.
+        Default: 0.15
+    gap (float)
+        The vertical gap between the supports and the surfaces that
+        they support or stand on.
+        Default: 0.2
+    """
+    assert 0 < density <= 1, "The support density must be in (0, 1]"
+    num_layers = int(np.ceil((vertices[:, 2].max()-base_offset)/layer_height))
+    origin = vertices[:, :2].min(axis=0)
+    nx, ny = np.ceil(np.ptp(vertices[:, :2], axis=0)/extrusion_width).astype(int) + 1
+    layers = [[] for _ in range(num_layers)]
+
+    normals = face_normals(vertices, faces)
+    overhang = overhang_faces(vertices, faces, angle)
+    if not overhang.any() or num_layers == 0:
+        return layers
+
+    # Faces that are vertical are not above or below any cell
+    flat = np.abs(normals[:, 2]) > 1e-9
+    cells, z, face = rasterize_faces(vertices, faces[flat], origin, extrusion_width, (ny, nx))
+    face = np.nonzero(flat)[0][face]
+    cells, bottom, top = support_spans(cells, z, normals[face, 2] > 0, overhang[face], gap)
+
+    # The first and last layer that each cell is supported on
+    on_bed = np.isinf(bottom)
+    first = np.zeros(len(bottom), dtype=int)
+    first[~on_bed] = np.maximum(np.floor((bottom[~on_bed] - base_offset)/layer_height).astype(int) + 1, 0)
+    last = np.minimum(np.ceil((top - base_offset)/layer_height).astype(int) - 1, num_layers-1)
+    keep = first <= last
+    cells, first, last = cells[keep], first[keep], last[keep]
+    logger.info(f"Supporting {len(np.unique(cells))} cells under {overhang.sum()} overhanging faces")
+
+    changes = np.zeros(nx*ny, dtype=int)
+    spacing = max(int(round(1/density)), 1)
+    starts, ends = np.argsort(first, kind="stable"), np.argsort(last, kind="stable")
+    start_layers, end_layers = first[starts], last[ends]
+    for i in range(num_layers):
+        # Accumulate the cells that start and stop being supported
+        np.add.at(changes, cells[starts[np.searchsorted(start_layers, i):np.searchsorted(start_layers, i, "right")]], 1)
+        np.add.at(changes, cells[ends[np.searchsorted(end_layers, i-1):np.searchsorted(end_layers, i-1, "right")]], -1)
+        occupied = changes.reshape(ny, nx) > 0
+        if occupied.any():
+            layers[i] = support_lines(occupied, origin, extrusion_width, spacing, i*layer_height + base_offset, axis=i%2)
+
+    return layers
+
+def support_lines(occupied, origin, cell_size, spacing, z, axis=0):
+    """The (2,3) lines along each `spacing`th row of cells, through the runs of `occupied` cells.
+
+    Lines run along x when `axis` is 0 and along y when it is 1. Runs of
+    a single cell are too short to print and are skipped.
+    """
+    grid = occupied if axis == 0 else occupied.T
+    rows = np.arange(spacing//2, len(grid), spacing)
+    padded = np.pad(grid[rows], ((0, 0), (1, 1)))
+    row, edge = np.nonzero(np.diff(padded.astype(int), axis=1))
+    # Edges come in pairs of where each run starts and where it ends
+    row, start, end = rows[row[::2]], edge[::2], edge[1::2] - 1
+    long = end > start
+    row, start, end = row[long], start[long], end[long]
+
+    ends = np.stack([np.column_stack([start, row]), np.column_stack([end, row])], axis=1)
+    if axis == 1:
+        ends = ends[:, :, ::-1]
+    xy = origin + (ends + 0.5)*cell_size
+    return [np.column_stack([line, np.full(2, z)]) for line in xy]
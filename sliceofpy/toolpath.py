@@ -0,0 +1,325 @@
+import numpy as np
+
+from .math_utils import segment_lengths
+from .infill import solid, sparse, points_in_region, Axis, INFILL_PATTERNS
+from .seam import place_seams, seam_reference
+
+# The printed features of a layer. Each can be given its own speed.
+# Every wall is an outer wall, including those around holes, as each contour has a single perimeter.
+FEATURES = ["outer_wall", "solid_infill", "sparse_infill", "support"]
+
+class Toolpath():
+    """A single continuous extrusion along (k,3) `points` that prints a `feature`.
+
+    `hole` marks closed paths around a hole, with the part outside of them.
+    """
+    def __init__(self, feature, points, closed=False, hole=False):
+        self.feature = feature
+        self.points = points
+        self.closed = closed
+        self.hole = hole
+
+    def __len__(self):
+        return len(self.points)
+
+    def __str__(self):
+        return f"Toolpath {self.feature}: {len(self)} points" + (" (closed)" if self.closed else "") + (" (hole)" if self.hole else "")
+
+    def __repr__(self):
+        return str(self)
+
+class Retraction():
+    """
+    How the filament is kept from oozing during travel moves.
+
+    Attributes:
+
+    length (float)
+        The length of filament to pull back before travelling. (mm)
+    speed (float)
+        The speed of the extruder when retracting and priming. (mm/min)
+    min_travel (float)
+        Travel moves shorter than this don't retract. Moves to another
+        layer always retract. (mm)
+    z_hop (float)
+        The height to lift the nozzle by while travelling. (mm)
+    coast (float)
+        The distance at the end of a path before a retraction that is
+        printed without extruding, using up the pressure in the nozzle. (mm)
+    wipe (float)
+        The distance to move along the start of a closed path while
+        retracting after it, without extruding. (mm)
+    """
+    def __init__(self, length=1, speed=2400, min_travel=2, z_hop=0, coast=0, wipe=0):
+        self.length = length
+        self.speed = speed
+        self.min_travel = min_travel
+        self.z_hop = z_hop
+        self.coast = coast
+        self.wipe = wipe
+
+    def retracts(self, start, end=None):
+        "Whether travelling from `start` to `end` retracts. A travel to an unknown `end` retracts."
+        if self.length <= 0 and self.z_hop <= 0:
+            return False
+        return end is None or start[2] != end[2] or np.hypot(*(end[:2]-start[:2])) >= self.min_travel
+
+    def __str__(self):
+        return ", ".join(f"{k.replace('_', ' ')}: {v}" for k,v in vars(self).items())
+
+    def __repr__(self):
+        return f"Retraction({str(self)})"
+
+def contour_loop(face_q):
+    "The closed loop of points traced by the faces of a contour. The first point is repeated at the end."
+    for i, face in enumerate(face_q):
+        if i == 0:
+            # for the first face, check which way to move
+            if len(face_q) > 1 and (all(face.contour_points[0] == face_q[1].contour_points[0]) or all(face.contour_points[0] == face_q[1].contour_points[1])):
+                start_pt = face.contour_points[1]
+                next_pt = face.contour_points[0]
+            else:
+                start_pt = face.contour_points[0]
+                next_pt = face.contour_points[1]
+            contour = [start_pt, next_pt]
+        else:
+            # for the rest of the way just go to the contour pt that isn't the same as the last
+            next_pt = face.contour_points[1 if all(face.contour_points[0] == last_pt) else 0]
+            contour.append(next_pt)
+        last_pt = next_pt
+
+    # connect back to the start
+    contour.append(start_pt)
+    return np.stack(contour)
+
+def contour_containment(loops):
+    "An (L,L) boolean matrix of whether loop `i` is inside the closed loop `j`, for (k,2+) `loops`."
+    inside = np.zeros((len(loops), len(loops)), dtype=bool)
+    if len(loops) < 2:
+        return inside
+
+    points = np.stack([loop[0, :2] for loop in loops])
+    for j, loop in enumerate(loops):
+        inside[:, j] = points_in_region(points, (loop[:-1], loop[1:]))
+    np.fill_diagonal(inside, False)
+    return inside
+
+def contour_depths(loops):
+    """The number of other closed `loops` that enclose each loop.
+
+    Loops at an even depth are the outer boundaries of islands and
+    loops at an odd depth are the boundaries of holes.
+    """
+    return contour_containment(loops).sum(axis=1)
+
+def orient_paths(paths, position=None):
+    "Start each path from whichever end is closest to the end of the previous path."
+    oriented = []
+    for path in paths:
+        if position is not None and np.hypot(*(path[-1, :2]-position[:2])) < np.hypot(*(path[0, :2]-position[:2])):
+            path = path[::-1]
+        oriented.append(path)
+        position = path[-1]
+    return oriented
+
+def layer_toolpaths(layer_qs, layer_num, num_layers, bounds, extrusion_width, misc_infill, misc_infill_kwargs, num_solid_fill,
+    seam="hidden", position=None, supports=None):
+    """Plan the supports, walls and infill of a single layer as a list of `Toolpath`s in print order.
+
+    Each wall starts at the seam chosen by `seam`, one of `SEAM_MODES`
+    or None to start where the contour was traced from. `position` is
+    the position of the nozzle before the layer. `supports` are the
+    paths of the supports on the layer, which are printed first.
+    """
+    toolpaths = [Toolpath("support", path) for path in orient_paths(supports or [], position)]
+    position = toolpaths[-1].points[-1] if len(toolpaths) > 0 else position
+
+    loops = [contour_loop(face_q) for face_q in layer_qs if len(face_q) > 0]
+    depths = contour_depths(loops)
+    walls = [Toolpath("outer_wall", loop, closed=True, hole=bool(depth % 2)) for loop, depth in zip(loops, depths)]
+    if seam is not None:
+        place_seams(walls, seam, seam_reference(bounds), position)
+    toolpaths += walls
+
+    # Add infill
+    # TODO: check if the layer above is smaller and add infill
+    if layer_num < num_solid_fill or layer_num >= num_layers - num_solid_fill or misc_infill == "solid":
+        # TODO: remove global minima for the axis and start at the layer min/max
+        axis = Axis.X if layer_num % 2 == 0 else Axis.Y
+        feature, paths = "solid_infill", solid(layer_qs, axis, bounds[2*axis], bounds[2*axis+1], extrusion_width)
+    elif misc_infill in INFILL_PATTERNS:
+        feature, paths = "sparse_infill", sparse(layer_qs, misc_infill, bounds, extrusion_width, **misc_infill_kwargs)
+    else:
+        feature, paths = None, []
+
+    position = toolpaths[-1].points[-1] if len(toolpaths) > 0 else position
+    toolpaths += [Toolpath(feature, path) for path in orient_paths(paths, position)]
+    return toolpaths
+
+def feature_speeds(feedrate, feedrate_writing, speeds=None):
+    """The speed in mm/min of each feature, of the first layer and of travel moves.
+
+    Features print at `feedrate_writing` and travel moves at `feedrate`
+    unless they are given in `speeds`. A first layer speed of None
+    prints the first layer at the speed of each feature.
+    """
+    resolved = {feature: feedrate_writing for feature in FEATURES}
+    resolved["first_layer"] = None
+    resolved["travel"] = feedrate
+    speeds = speeds or {}
+    unknown = set(speeds) - set(resolved)
+    if len(unknown) > 0:
+        raise ValueError(f"Speeds not recognized: {sorted(unknown)}. Use any of {list(resolved)}")
+    resolved.update(speeds)
+    return resolved
+
+def path_lengths(toolpaths, position=None):
+    """The extruded length of each toolpath and the total travel length between them.
+
+    All of the points are measured with a single call. Travel is the
+    distance from `position` to the first path and between the end and
+    start of consecutive paths.
+    """
+    if len(toolpaths) == 0:
+        return np.zeros(0), 0
+    points = np.concatenate([tp.points for tp in toolpaths])
+    lengths = segment_lengths(points[:-1], points[1:])
+    ends = np.cumsum([len(tp) for tp in toolpaths]) - 1
+
+    # The segments that join one path to the next are travel moves
+    travel = lengths[ends[:-1]].sum()
+    lengths[ends[:-1]] = 0
+    if position is not None:
+        travel += segment_lengths(np.asarray(position)[:3], points[0])
+    return np.add.reduceat(np.append(lengths, 0), np.concatenate([[0], ends[:-1]+1])), travel
+
+def layer_speeds(speeds, layer_num, toolpaths, min_layer_time=0, min_print_speed=600, position=None):
+    """The speed of each feature for a layer.
+
+    The first layer speed replaces the speed of every feature on the
+    first layer. If printing the layer would take less than
+    `min_layer_time` seconds, all the features are slowed down evenly,
+    to no less than `min_print_speed`, so that the layer has time to cool.
+    """
+    speeds = dict(speeds)
+    if layer_num == 0 and speeds["first_layer"] is not None:
+        speeds.update({feature: speeds["first_layer"] for feature in FEATURES})
+
+    if min_layer_time <= 0 or len(toolpaths) == 0:
+        return speeds
+
+    lengths, travel = path_lengths(toolpaths, position)
+    print_time = 60*np.sum(lengths/np.array([speeds[tp.feature] for tp in toolpaths]))
+    travel_time = 60*travel/speeds["travel"]
+    if print_time == 0 or print_time + travel_time >= min_layer_time:
+        return speeds
+
+    factor = print_time/(min_layer_time - travel_time)
+    speeds.update({feature: max(speeds[feature]*factor, min(min_print_speed, speeds[feature])) for feature in FEATURES})
+    return speeds
+
+def coast_path(points, extruded, distance):
+    """Stop extruding `distance` before the end of a path.
+
+    `extruded` is the absolute extruder position at each of the points.
+    The path is split where extrusion stops and the new points and
+    extruder positions are returned. Paths shorter than twice `distance`
+    are not coasted.
+    """
+    travelled = np.concatenate([[0], np.cumsum(segment_lengths(points[:-1], points[1:]))])
+    if distance <= 0 or travelled[-1] <= 2*distance:
+        return points, extruded
+
+    stop = travelled[-1] - distance
+    i = np.searchsorted(travelled, stop, side="right")
+    split = [np.interp(stop, travelled, points[:, k]) for k in range(points.shape[1])]
+    e_stop = np.interp(stop, travelled, extruded)
+    return (np.concatenate([points[:i], [split], points[i:]]),
+            np.concatenate([extruded[:i], np.full(len(extruded)-i+1, e_stop)]))
+
+def wipe_path(points, distance):
+    "The points to move through to wipe `distance` along the start of a closed path, after it has been printed."
+    travelled = np.concatenate([[0], np.cumsum(segment_lengths(points[:-1], points[1:]))])
+    if distance <= 0 or travelled[-1] == 0:
+        return points[:0]
+
+    stop = min(distance, travelled[-1])
+    i = np.searchsorted(travelled, stop, side="left")
+    split = [np.interp(stop, travelled, points[:, k]) for k in range(points.shape[1])]
+    # Skip repeated points rather than making moves that go nowhere
+    moves = np.diff(travelled[:i]) > 0
+    return np.concatenate([points[1:i][moves], [split]])
+
+def retract(g, retraction, total_extruded, wipe=None, speed=None):
+    """Retract the filament before a travel move.
+
+    When there are `wipe` points the nozzle moves through them while the
+    filament is drawn back, so that it is not dragged across the part
+    while it is still under pressure. `speed` is the speed of the wipe.
+    """
+    e = total_extruded - max(retraction.length, 0)
+    if wipe is not None and len(wipe) > 0:
+        # Retract evenly over the length of the wipe
+        start = np.array([g.X or 0, g.Y or 0, g.Z or 0], dtype=float)
+        travelled = np.cumsum(segment_lengths(np.concatenate([[start], wipe[:-1]]), wipe))
+        for pt, wiped in zip(wipe, travelled/max(travelled[-1], 1e-12)):
+            g.retract(total_extruded - wiped*(total_extruded - e), F=speed, x=pt[0], y=pt[1], z=pt[2])
+    elif retraction.length > 0:
+        g.retract(e, F=retraction.speed)
+    g.retracted = True
+
+def travel(g, point, speeds, retraction=None, total_extruded=0):
+    """Travel to `point`. If the filament was retracted, lift the nozzle
+    over the part and prime the filament again when it gets there.
+    """
+    if retraction is None or not g.retracted:
+        g.abs_move(*point, rapid=True, F=speeds["travel"])
+        return
+
+    start = np.array([g.X or 0, g.Y or 0, g.Z or 0], dtype=float)
+    if retraction.z_hop > 0:
+        hop = max(start[2], point[2]) + retraction.z_hop
+        g.abs_move(start[0], start[1], hop, rapid=True, F=speeds["travel"])
+        g.abs_move(point[0], point[1], hop, rapid=True, F=speeds["travel"])
+    g.abs_move(*point, rapid=True, F=speeds["travel"])
+    if retraction.length > 0:
+        g.retract(total_extruded, F=retraction.speed)
+    g.retracted = False
+
+def write_toolpaths(g, toolpaths, speeds, extrusion_rate, total_extruded, total_distance, retraction=None, next_start=None):
+    """Travel to and extrude along each of the `toolpaths` at the speed of its feature.
+
+    Whether to retract is decided once, at the end of each path, from the
+    end of the path and the start of the next. Paths that are followed by
+    a retraction are coasted, and closed paths are wiped while the
+    filament is retracted. `next_start` is where the nozzle travels to
+    after the last path, if it is known.
+    """
+    feature = None
+    for i, tp in enumerate(toolpaths):
+        if tp.feature != feature:
+            feature = tp.feature
+            g.write(f"\n; Printing {feature.replace('_', ' ')}")
+
+        # calculate how much to extrude for every move at once
+        distances = segment_lengths(tp.points[:-1], tp.points[1:])
+        extruded = np.cumsum(np.concatenate([[total_extruded], extrusion_rate*distances]))
+        total_distance += distances.sum()
+
+        points = tp.points
+        end = toolpaths[i+1].points[0] if i+1 < len(toolpaths) else next_start
+        retracts = retraction is not None and retraction.retracts(points[-1], end)
+        if retracts:
+            points, extruded = coast_path(points, extruded, retraction.coast)
+
+        # move the cursor
+        travel(g, points[0], speeds, retraction, extruded[0])
+        for pt, e in zip(points[1:], extruded[1:]):
+            g.abs_move(*pt, F=speeds[feature], E=e)
+        total_extruded = extruded[-1]
+
+        if retracts:
+            wipe = wipe_path(tp.points, retraction.wipe) if tp.closed else None
+            retract(g, retraction, total_extruded, wipe, speeds["travel"])
+
+    return total_distance, total_extruded
@@ -0,0 +1,33 @@
+import os
+import numpy as np
+
+from sliceofpy.draw import join_paths, decimate
+from sliceofpy.slicer import generate_gcode
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+def test_join_paths():
+    a = np.zeros((2,3))
+    b = np.ones((3,3))
+    path = join_paths([a, b])
+    assert path.shape == (6,3)
+    assert np.isnan(path[2]).all()
+    assert join_paths([]).shape == (0,3)
+
+def test_decimate():
+    line = np.stack([np.linspace(0, 1, 101), np.zeros(101), np.zeros(101)], 1)
+    path = join_paths([line, line+1])
+    dec = decimate(path, 0.1)
+    assert len(dec) < len(path)
+    assert np.isnan(dec[:, 0]).sum() == 1
+    # The ends of each sub-path are kept
+    assert all(dec[0] == line[0]) and all(dec[-1] == line[-1]+1)
+
+def test_save_thumbnails(tmp_path):
+    g = generate_gcode(os.path.join(__location__, "./pyramid.obj"), outfile=str(tmp_path/"out.gcode"))
+    files = g.save_thumbnails(str(tmp_path/"png"), processes=2)
+    assert len(files) == len(g.layer_paths())
+    assert all(os.path.exists(f) for f in files)
+
+    files = g.save_thumbnails(str(tmp_path/"svg"), fmt="svg", processes=1)
+    assert all(f.endswith(".svg") and os.path.exists(f) for f in files)
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+
+from sliceofpy.infill import infill_pattern, clip_segments, points_in_region, INFILL_PATTERNS
+from sliceofpy.slicer import generate_gcode
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+def square(size, z=0):
+    "Contour segments of a square centered at the origin"
+    corners = np.array([[-1,-1,z], [1,-1,z], [1,1,z], [-1,1,z]])*np.array([size/2, size/2, 1])
+    return corners, np.roll(corners, -1, axis=0)
+
+def test_points_in_region():
+    outer, hole = square(10), square(4)
+    region = np.concatenate([outer[0], hole[0]]), np.concatenate([outer[1], hole[1]])
+    pts = np.array([[0,0], [3,3], [6,0]])
+    assert list(points_in_region(pts, region)) == [False, True, False]
+
+def test_clip_segments():
+    starts = np.array([[-10., 0], [-10, 20]])
+    ends = np.array([[10., 0], [10, 20]])
+    paths = clip_segments(starts, ends, np.arange(2), square(10))
+    assert len(paths) == 1
+    assert np.allclose(paths[0], [[-5, 0], [5, 0]])
+
+    # A hole splits the line in two
+    outer, hole = square(10), square(4)
+    region = np.concatenate([outer[0], hole[0]]), np.concatenate([outer[1], hole[1]])
+    paths = clip_segments(starts, ends, np.arange(2), region)
+    assert len(paths) == 2
+    assert np.allclose(np.concatenate(paths), [[-5, 0], [-2, 0], [2, 0], [5, 0]])
+
+def test_clip_segments_small_region():
+    # A region between two lines of the pattern has nothing to fill
+    starts = np.array([[-10., -2], [-10, 2]])
+    ends = np.array([[10., -2], [10, 2]])
+    assert clip_segments(starts, ends, np.arange(2), square(1)) == []
+    # Nor does a region away from every segment
+    assert clip_segments(starts, ends, np.arange(2), (square(1)[0] + [30, 30, 0], square(1)[1] + [30, 30, 0])) == []
+
+def test_sparse_gap_between_crosses(tmp_path):
+    # The old cross infill argument still works, as a density
+    with pytest.warns(DeprecationWarning, match="density of 0.16"):
+        generate_gcode(os.path.join(__location__, "./block.obj"), outfile=str(tmp_path/"out.gcode"),
+                       misc_infill="cross", misc_infill_kwargs={'gap_between_crosses': 5})
+
+@pytest.mark.parametrize("pattern", list(INFILL_PATTERNS))
+def test_infill_pattern(pattern):
+    bounds = (-10, 10, -10, 10)
+    starts, ends, ids = infill_pattern(pattern, bounds, 0.2, 0.4, z=1)
+    assert starts.shape == ends.shape and len(ids) == len(starts)
+    # Patterns are cached and reused between layers
+    assert infill_pattern(pattern, bounds, 0.2, 0.4, z=1)[0] is starts
+
+    paths = clip_segments(starts, ends, ids, square(20, z=1))
+    length = sum(np.linalg.norm(np.diff(p, axis=0), axis=1).sum() for p in paths)
+    # The filled fraction of the area is close to the density
+    assert abs(length*0.4/400 - 0.2) < 0.03
+    assert all(np.all(np.abs(p) <= 10 + 1e-9) for p in paths)
+
+@pytest.mark.parametrize("pattern", list(INFILL_PATTERNS))
+@pytest.mark.parametrize("filename", ["ring.obj", "pyramid.obj", "icecream.obj"])
+def test_generate_gcode_patterns(pattern, filename, tmp_path):
+    generate_gcode(os.path.join(__location__, filename), outfile=str(tmp_path/"out.gcode"), misc_infill=pattern)
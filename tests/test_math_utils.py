@@ -1,6 +1,6 @@
 import numpy as np
 
-from sliceofpy.math_utils import get_intersection, distance_between
+from sliceofpy.math_utils import get_intersection, distance_between, intersect_segments, segment_lengths
 
 def test_get_intersection():
     c1 = np.array([1,1,1])
@@ -30,3 +30,19 @@ def test_distance_between():
     c2 = np.array([1,1,3])
     assert distance_between(c1, c2) == 2
     assert distance_between(c2, c1) == 2
+
+def test_intersect_segments():
+    c1 = np.array([[1,1,1], [1,1,1], [0,0,0]])
+    c2 = np.array([[1,1,3], [3,3,5], [2,0,0]])
+    pts = intersect_segments(c1, c2, 2, 2)
+    assert np.all(pts[:2] == np.array([[1,1,2], [1.5,1.5,2]]))
+    # Segments parallel to the plane have no single intersection
+    assert np.isnan(pts[2]).all()
+
+    pts = intersect_segments(c1[:2], c2[:2], 2, np.array([2, 3]))
+    assert np.all(pts == np.array([[1,1,2], [2,2,3]]))
+
+def test_segment_lengths():
+    c1 = np.array([[1,1,1], [1,1,1], [0,0,0]])
+    c2 = np.array([[3,1,1], [1,1,1], [0,3,4]])
+    assert np.all(segment_lengths(c1, c2) == np.array([2, 0, 5]))
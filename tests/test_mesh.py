@@ -0,0 +1,86 @@
+import os
+import numpy as np
+
+from sliceofpy.mesh import Adjacency, repair_mesh, weld_vertices, triangulate
+from sliceofpy.slicer import parse_obj, layer_contours
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+def load_block():
+    faces, vertices = parse_obj(os.path.join(__location__, "./block.obj"))
+    return vertices, triangulate(faces)
+
+def test_adjacency():
+    vertices, faces = load_block()
+    adj = Adjacency(faces)
+    assert len(adj.edges) == 18
+    assert np.all(adj.edge_counts == 2)
+    assert len(adj.boundary_edges) == 0
+    assert len(adj.inconsistent_edges) == 0
+    for f in range(len(faces)):
+        for e in adj.face_edges[f]:
+            n = adj.neighbor(f, e)
+            assert n != f and e in adj.face_edges[n]
+
+def test_weld_vertices():
+    vertices, faces = load_block()
+    # Give every face its own copy of its vertices
+    split_vertices = vertices[faces.reshape(-1)] + 1e-9
+    split_faces = np.arange(len(split_vertices)).reshape(-1, 3)
+    welded, welded_faces = weld_vertices(split_vertices, split_faces)
+    assert len(welded) == len(vertices)
+    assert len(Adjacency(welded_faces).boundary_edges) == 0
+
+    # Copies jittered by up to a third of the tolerance, so that many straddle cell boundaries
+    jittered = vertices[faces.reshape(-1)] + np.random.RandomState(0).uniform(-1, 1, (len(split_vertices), 3))*1e-6/3
+    welded, welded_faces = weld_vertices(jittered, split_faces)
+    assert len(welded) == len(vertices)
+    assert len(Adjacency(welded_faces).boundary_edges) == 0
+
+def test_weld_vertices_cell_boundary():
+    vertices = np.array([[0.4e-6, 0, 0], [0.6e-6, 0, 0], [1, 0, 0], [0, 1, 0]])
+    faces = np.array([[0, 2, 3], [1, 3, 2]])
+    welded, welded_faces = weld_vertices(vertices, faces)
+    assert len(welded) == 3
+    assert np.all(welded[0] == vertices[0])
+    assert np.all(welded_faces == [[0, 1, 2], [0, 2, 1]])
+
+def test_repair_mesh():
+    vertices, faces = load_block()
+    broken = faces.copy()
+    broken[0] = broken[0][::-1]              # flipped face
+    broken = np.concatenate([broken[:-1], broken[:1]]) # hole and duplicate face
+
+    assert len(Adjacency(broken).boundary_edges) > 0
+
+    repaired_vertices, repaired, adj, report = repair_mesh(vertices, broken)
+    assert report.watertight
+    assert report.removed_faces == 1
+    assert report.filled_holes == 1
+    assert len(adj.inconsistent_edges) == 0
+
+    # A single closed contour at every height
+    for z in np.linspace(1, 19, 5):
+        contours = layer_contours(repaired_vertices, adj, z)
+        assert len(contours) == 1
+        assert np.all(contours[0][0].contour_points[0] == contours[0][-1].contour_points[1])
+
+def test_repair_mesh_open_away_from_origin():
+    # A correctly wound box without its top, well away from the origin
+    vertices = np.array([[x, y, z] for z in (100, 120) for y in (0, 10) for x in (0, 10)], dtype=float)
+    faces = np.array([[0,2,1], [1,2,3], [0,1,4], [1,5,4], [2,6,3], [3,6,7],
+                      [0,4,2], [2,4,6], [1,3,5], [3,7,5]])
+    repaired_vertices, repaired, adj, report = repair_mesh(vertices, faces)
+    assert report.watertight
+    assert report.flipped_faces == 0
+    assert np.all(repaired[:len(faces)] == faces)
+
+    # The filled top faces up
+    tris = repaired_vertices[repaired[len(faces):]]
+    normals = np.cross(tris[:, 1]-tris[:, 0], tris[:, 2]-tris[:, 0])
+    assert np.all(normals[:, 2] > 0)
+
+    # Wound inside out it is flipped the right way
+    _, flipped, _, report = repair_mesh(vertices, faces[:, ::-1])
+    assert report.flipped_faces == len(faces)
+    assert np.all(flipped[:len(faces)] == faces)
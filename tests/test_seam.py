@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from sliceofpy.seam import turning_angles, seam_scores, rotate_loop, place_seams
+from sliceofpy.toolpath import Toolpath
+
+def l_loop():
+    "A closed counter-clockwise L shape with a single concave corner at (1, 1)"
+    pts = np.array([[0,0], [2,0], [2,1], [1,1], [1,2], [0,2], [0,0]], dtype=float)
+    return np.column_stack([pts, np.zeros(len(pts))])
+
+def test_turning_angles():
+    angles = turning_angles(l_loop())
+    assert np.allclose(angles, np.pi/2*np.array([1, 1, 1, -1, 1, 1]))
+    assert np.isclose(angles.sum(), 2*np.pi)
+
+def test_turning_angles_repeated_points():
+    loop = l_loop()
+    loop = np.concatenate([loop[:4], loop[3:]])
+    angles = turning_angles(loop)
+    assert np.isclose(angles.sum(), 2*np.pi)
+    assert np.isclose(angles.min(), -np.pi/2)
+
+def test_seam_scores():
+    loop = l_loop()
+    reference = np.array([0, 10])
+    assert np.argmin(seam_scores(loop, "aligned", reference)) in [4, 5]
+    assert np.argmin(seam_scores(loop, "nearest", reference, position=np.array([2.1, 0]))) == 1
+    # The concave corner hides the seam
+    assert np.argmin(seam_scores(loop, "hidden", reference)) == 3
+    # Wound the other way it hides the seam just as well
+    assert np.all(loop[::-1][np.argmin(seam_scores(loop[::-1], "hidden", reference)), :2] == [1, 1])
+    # As a hole the part is on the other side so the corner is convex
+    assert np.argmin(seam_scores(loop, "hidden", reference, hole=True)) != 3
+    with pytest.raises(ValueError):
+        seam_scores(loop, "random", reference)
+
+def test_rotate_loop():
+    loop = rotate_loop(l_loop(), 3)
+    assert np.all(loop[0] == [1, 1, 0]) and np.all(loop[-1] == loop[0])
+    assert len(loop) == len(l_loop())
+
+def test_place_seams():
+    toolpaths = [Toolpath("outer_wall", l_loop(), closed=True), Toolpath("sparse_infill", l_loop()[:2])]
+    place_seams(toolpaths, "hidden", np.array([0, 10]))
+    assert np.all(toolpaths[0].points[0, :2] == [1, 1])
+    # Open paths are left alone
+    assert np.all(toolpaths[1].points == l_loop()[:2])
+
+def test_place_seams_hole():
+    # Around a hole the concave corner of the loop is a convex corner of the part
+    toolpaths = [Toolpath("outer_wall", l_loop(), closed=True, hole=True)]
+    place_seams(toolpaths, "hidden", np.array([0, 10]))
+    assert not np.all(toolpaths[0].points[0, :2] == [1, 1])
@@ -0,0 +1,49 @@
+import os
+import types
+import numpy as np
+
+from sliceofpy.slicer import parse_obj
+from sliceofpy.sections import slice_mesh, iter_slices, save_svg, save_npz, load_npz, signed_area
+
+__location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
+
+def test_slice_mesh_block():
+    faces, vertices = parse_obj(os.path.join(__location__, "./block.obj"))
+    sections = slice_mesh(vertices, faces, [1, 10, 19])
+    assert len(sections) == 3
+    for section in sections:
+        assert len(section.islands()) == 1
+        assert np.isclose(section.area(), 400)
+
+def test_slice_mesh_holes():
+    faces, vertices = parse_obj(os.path.join(__location__, "./ring.obj"))
+    section = slice_mesh(vertices, faces, [2.5])[0]
+    (outer, holes), = section.islands()
+    assert len(holes) == 1
+    assert signed_area(outer) > 0 and signed_area(holes[0]) < 0
+    assert np.isclose(section.area(), signed_area(outer) + signed_area(holes[0]))
+
+def test_iter_slices_is_lazy():
+    faces, vertices = parse_obj(os.path.join(__location__, "./pyramid.obj"))
+    slices = iter_slices(vertices, faces, np.arange(0.5, 20, 0.5))
+    assert isinstance(slices, types.GeneratorType)
+    areas = [next(slices).area() for _ in range(3)]
+    # The pyramid gets smaller as it gets higher
+    assert areas[0] > areas[1] > areas[2]
+
+def test_export(tmp_path):
+    faces, vertices = parse_obj(os.path.join(__location__, "./ring.obj"))
+    sections = slice_mesh(vertices, faces, np.arange(0.5, 5, 1))
+
+    files = save_svg(sections, str(tmp_path/"svg"))
+    assert len(files) == len(sections)
+    with open(files[0]) as f:
+        assert f.read().startswith("<svg")
+
+    save_npz(sections, str(tmp_path/"sections.npz"))
+    loaded = load_npz(str(tmp_path/"sections.npz"))
+    for a, b in zip(sections, loaded):
+        assert a.z == b.z
+        assert np.array_equal(a.points, b.points)
+        assert np.array_equal(a.offsets, b.offsets)
+        assert np.array_equal(a.parents, b.parents)
@@ -1,5 +1,8 @@
 import os
-from sliceofpy.slicer import generate_gcode
+import logging
+import numpy as np
+
+from sliceofpy.slicer import generate_gcode, generate_plate_gcode, arrange_objects, xy_bounds, bounds_overlap
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
@@ -20,3 +23,57 @@ def test_generate_gcode_icecream(): # mmm
 
 def test_generate_gcode_torus():
     generate_gcode(os.path.join(__location__, "./torus.obj"))
+
+def test_generate_plate_gcode(tmp_path):
+    objects = [os.path.join(__location__, "./block.obj"), (os.path.join(__location__, "./ring.obj"), (0, 30))]
+    g, plate = generate_plate_gcode(objects, outfile=str(tmp_path/"out.gcode"), processes=2)
+    block, ring = plate
+    assert len(block) == 100 and len(ring) == 25
+    assert block.total_distance > 0 and ring.total_distance > 0
+    assert abs((ring.bounds[2] + ring.bounds[3])/2 - 30) < 1e-6
+    # The ring's layers are interleaved with the block's
+    with open(tmp_path/"out.gcode") as f:
+        assert f.read().count("; Printing object ring.obj #1") == 25
+
+def test_generate_plate_gcode_copies(tmp_path):
+    block = os.path.join(__location__, "./block.obj")
+    g, plate = generate_plate_gcode([block, block], outfile=str(tmp_path/"out.gcode"), processes=1)
+    assert [obj.name for obj in plate] == ["block.obj #0", "block.obj #1"]
+    assert not bounds_overlap(plate[0].bounds, plate[1].bounds)
+
+def square(size):
+    "The vertices of a square, centered at the origin"
+    return np.array([[-1, -1, 0], [1, -1, 0], [1, 1, 0], [-1, 1, 0]], dtype=float)*size/2
+
+def test_arrange_objects(caplog):
+    # The row is centered at the origin when it is clear of the placed objects
+    meshes = [(square(10), None), (square(10), None), (square(10), None)]
+    arrange_objects(meshes, [None, None, (0, 30)], 5)
+    assert np.allclose(xy_bounds(meshes[0][0]), (-12.5, -2.5, -5, 5))
+    assert np.allclose(xy_bounds(meshes[1][0]), (2.5, 12.5, -5, 5))
+
+    # Otherwise it moves in front of them
+    meshes = [(square(10), None), (square(10), None), (square(10), None)]
+    arrange_objects(meshes, [None, (3, 2), None], 5)
+    assert np.allclose(xy_bounds(meshes[0][0]), (-12.5, -2.5, -18, -8))
+    assert np.allclose(xy_bounds(meshes[2][0]), (2.5, 12.5, -18, -8))
+
+    # Placed objects that overlap are only warned about
+    meshes = [(square(10), None), (square(10), None)]
+    with caplog.at_level(logging.WARNING):
+        arrange_objects(meshes, [(0, 0), (5, 5)], 5)
+    assert "overlap" in caplog.text
+
+def test_generate_gcode_retraction(tmp_path):
+    g = generate_gcode(os.path.join(__location__, "./2block.obj"), outfile=str(tmp_path/"out.gcode"), seam="aligned",
+                       retract_length=2, z_hop=0.4, coast_distance=0.5, wipe_distance=1)
+    # Lifting the nozzle to travel does not split the layers
+    assert len(g.layer_paths()) == 100
+    with open(tmp_path/"out.gcode") as f:
+        retractions = [line for line in f if line.startswith("G1 E")]
+    assert len(retractions) > 0 and len(retractions) % 2 == 0
+
+def test_generate_gcode_support(tmp_path):
+    generate_gcode(os.path.join(__location__, "./torus.obj"), outfile=str(tmp_path/"out.gcode"), support=True)
+    with open(tmp_path/"out.gcode") as f:
+        assert "; Printing support" in f.read()
@@ -0,0 +1,53 @@
+import numpy as np
+
+from sliceofpy.support import face_normals, overhang_faces, rasterize_faces, support_layers, support_lines
+
+def box(lo, hi):
+    "The vertices and outward facing triangles of an axis aligned box"
+    vertices = np.array([[x, y, z] for z in (lo[2], hi[2]) for y in (lo[1], hi[1]) for x in (lo[0], hi[0])], dtype=float)
+    faces = np.array([[0,2,1], [1,2,3], [4,5,6], [5,7,6], [0,1,4], [1,5,4],
+                      [2,6,3], [3,6,7], [0,4,2], [2,4,6], [1,3,5], [3,7,5]])
+    return vertices, faces
+
+def shelf():
+    "A 10mm cube with a 2mm thick shelf on top that overhangs by 10mm along x"
+    v1, f1 = box([0, 0, 0.1], [10, 10, 10.1])
+    v2, f2 = box([0, 0, 10.1], [20, 10, 12.1])
+    return np.concatenate([v1, v2]), np.concatenate([f1, f2 + len(v1)])
+
+def test_overhang_faces():
+    vertices, faces = box([0, 0, 0], [1, 1, 1])
+    normals = face_normals(vertices, faces)
+    assert np.allclose(np.abs(normals).sum(axis=1), 1)
+    # Only the bottom faces down
+    assert np.all(overhang_faces(vertices, faces) == (normals[:, 2] == -1))
+
+def test_rasterize_faces():
+    vertices, faces = box([0, 0, 0], [2, 2, 1])
+    cells, z, face = rasterize_faces(vertices, faces, np.array([0, 0]), 1, (2, 2))
+    # Every cell is covered by the bottom and by the top, and not by the sides
+    assert set(zip(cells.tolist(), z.tolist())) == {(cell, height) for cell in range(4) for height in (0, 1)}
+    assert np.all(np.abs(face_normals(vertices, faces)[face, 2]) == 1)
+
+def test_support_layers():
+    vertices, faces = shelf()
+    layers = support_layers(vertices, faces, 0.2, 0.1, extrusion_width=0.4, density=0.25, gap=0.2)
+    assert len(layers) == 60
+    supported = [i for i, lines in enumerate(layers) if len(lines) > 0]
+    # From the bed to a gap below the shelf
+    assert supported == list(range(49))
+
+    points = np.concatenate([line for lines in layers for line in lines])
+    # Only under the part of the shelf that overhangs the cube
+    assert points[:, 0].min() > 10 and points[:, 0].max() < 20
+    assert np.all(points[:, 2] < 10.1 - 0.2)
+
+def test_support_lines():
+    occupied = np.zeros((4, 6), dtype=bool)
+    occupied[:, 1:4] = True
+    occupied[:, 5] = True
+    lines = support_lines(occupied, np.array([0, 0]), 1, 2, z=3)
+    assert len(lines) == 2
+    assert np.allclose(lines[0], [[1.5, 1.5, 3], [3.5, 1.5, 3]])
+    lines = support_lines(occupied, np.array([0, 0]), 1, 2, z=3, axis=1)
+    assert np.allclose(lines[0][:, 0], 1.5) and np.allclose(lines[0][:, 1], [0.5, 3.5])
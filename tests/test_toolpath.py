@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from sliceofpy.draw import G
+from sliceofpy.toolpath import Toolpath, Retraction, write_toolpaths, contour_depths, feature_speeds, layer_speeds, path_lengths, coast_path, wipe_path
+
+def square_loop(size, z=0):
+    "A closed square loop centered at the origin"
+    corners = np.array([[-1,-1], [1,-1], [1,1], [-1,1], [-1,-1]])*size/2
+    return np.column_stack([corners, np.full(5, z)])
+
+def test_contour_depths():
+    loops = [square_loop(10), square_loop(6), square_loop(2), square_loop(10) + [20, 0, 0]]
+    assert list(contour_depths(loops)) == [0, 1, 2, 0]
+
+def test_path_lengths():
+    toolpaths = [Toolpath("outer_wall", square_loop(10), closed=True),
+                 Toolpath("sparse_infill", np.array([[0., 0, 0], [3, 4, 0]]))]
+    lengths, travel = path_lengths(toolpaths, position=[0, 0, 0])
+    assert np.allclose(lengths, [40, 5])
+    # From the origin to the square and from the square to the line
+    assert np.isclose(travel, 2*np.hypot(5, 5))
+
+def test_feature_speeds():
+    speeds = feature_speeds(3600, 1800, {"sparse_infill": 5000})
+    assert speeds["sparse_infill"] == 5000
+    assert speeds["outer_wall"] == 1800
+    assert speeds["travel"] == 3600
+    with pytest.raises(ValueError):
+        feature_speeds(3600, 1800, {"walls": 100})
+
+def test_layer_speeds():
+    speeds = feature_speeds(3600, 1800, {"first_layer": 600})
+    toolpaths = [Toolpath("outer_wall", square_loop(10), closed=True)]
+
+    assert layer_speeds(speeds, 0, toolpaths)["outer_wall"] == 600
+    assert layer_speeds(speeds, 1, toolpaths)["outer_wall"] == 1800
+
+    # 40mm at 1800mm/min takes 1.33s, so slow down to take 4s
+    slowed = layer_speeds(speeds, 1, toolpaths, min_layer_time=4, min_print_speed=100)
+    assert np.isclose(slowed["outer_wall"], 600)
+    assert slowed["travel"] == 3600
+
+    # But not below the minimum print speed
+    slowed = layer_speeds(speeds, 1, toolpaths, min_layer_time=60, min_print_speed=100)
+    assert slowed["outer_wall"] == 100
+
+def test_retracts():
+    retraction = Retraction(length=1, min_travel=2)
+    assert not retraction.retracts(np.array([0, 0, 0]), np.array([1, 1, 0]))
+    assert retraction.retracts(np.array([0, 0, 0]), np.array([3, 0, 0]))
+    # Changing layers always retracts
+    assert retraction.retracts(np.array([0, 0, 0]), np.array([0, 0, 0.2]))
+    assert retraction.retracts(np.array([0, 0, 0]))
+    assert not Retraction(length=0).retracts(np.array([0, 0, 0]), np.array([30, 0, 0]))
+
+def test_coast_path():
+    points = square_loop(10)
+    extruded = np.arange(5, dtype=float)
+    coasted, e = coast_path(points, extruded, 2)
+    assert len(coasted) == 6 and len(e) == 6
+    assert np.allclose(coasted[-2], [-5, -3, 0])
+    assert np.allclose(e, [0, 1, 2, 3, 3.8, 3.8])
+    # Too short to coast
+    assert coast_path(points, extruded, 30)[0] is points
+
+def test_wipe_path():
+    wipe = wipe_path(square_loop(10), 12)
+    assert np.allclose(wipe, [[5, -5, 0], [5, -3, 0]])
+    assert len(wipe_path(square_loop(10), 0)) == 0
+
+def test_write_toolpaths_retraction(tmp_path):
+    # The wipe ends next to the start of the infill, but the travel from the end of the wall still retracts
+    toolpaths = [Toolpath("outer_wall", square_loop(10), closed=True),
+                 Toolpath("sparse_infill", np.array([[5.5, -3, 0], [5.5, 3, 0]]))]
+    retraction = Retraction(length=1, min_travel=2, coast=1, wipe=12)
+    speeds = feature_speeds(3600, 1800)
+    with open(tmp_path/"out.gcode", "w") as f:
+        with G(square_loop(10), outfile=f, layer_height=0.2) as g:
+            write_toolpaths(g, toolpaths, speeds, 0.1, 0, 0, retraction, next_start=np.array([0, 0, 0.2]))
+    with open(tmp_path/"out.gcode") as f:
+        lines = [line.strip() for line in f if line.startswith("G")]
+
+    wall_end = lines.index("G1 X-5.000000 Y-5.000000 Z0.000000 E3.900000 F1800.000000")
+    # Retracts while wiping along the start of the wall, then primes at the infill
+    assert lines[wall_end+1].startswith("G1 X5.000000 Y-5.000000") and "E3.066667" in lines[wall_end+1]
+    assert lines[wall_end+2].startswith("G1 X5.000000 Y-3.000000") and "E2.900000" in lines[wall_end+2]
+    assert lines[wall_end+3].startswith("G0 X5.500000 Y-3.000000")
+    assert lines[wall_end+4] == "G1 E3.900000 F2400.000000"